@@ -40,7 +40,7 @@ def run_app():
           <ul>
             <li>API接続エラーの場合: <code>.env</code> ファイルのAPIキーを確認してください</li>
             <li>Google Sheetsエラーの場合: <code>credentials.json</code> が正しく設定されているか確認してください</li>
-            <li>アップロードエラーの場合: ファイルサイズと形式を確認してください（mp3形式、25MB以下）</li>
+            <li>アップロードエラーの場合: ファイル形式を確認してください（mp3形式）</li>
           </ul>
         </div>
         """, unsafe_allow_html=True)
@@ -0,0 +1,172 @@
+"""
+OpenAI Batch APIとの通信を行うモジュール（夜間の一括処理用）
+"""
+
+import json
+import time
+import uuid
+import httpx
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+def build_batch_line(custom_id, system_prompt, user_prompt, model, temperature=0.0, response_format=None):
+    """バッチ入力ファイル（JSONL）の1行分のリクエストを作成"""
+    line = {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": BATCH_ENDPOINT,
+        "body": {
+            "model": model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            "temperature": temperature
+        }
+    }
+    if response_format:
+        line["body"]["response_format"] = response_format
+    return line
+
+
+class OpenAIBatchBackend:
+    """OpenAI Batch APIを使うバックエンド"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def create_batch(self, input_jsonl):
+        """入力ファイルをアップロードしてバッチを作成し、バッチIDを返す"""
+        input_file = self.client.files.create(
+            file=("quality_check_batch.jsonl", input_jsonl.encode("utf-8")),
+            purpose="batch"
+        )
+        batch = self._request("post", "/batches", body={
+            "input_file_id": input_file.id,
+            "endpoint": BATCH_ENDPOINT,
+            "completion_window": "24h"
+        })
+        return batch["id"]
+
+    def retrieve_batch(self, batch_id):
+        """バッチの状態を取得"""
+        return self._request("get", f"/batches/{batch_id}")
+
+    def download_file(self, file_id):
+        """出力ファイルの内容を取得"""
+        return self.client.files.content(file_id).text
+
+    def _request(self, method, path, body=None):
+        # 固定しているSDKのバージョンにはbatchesリソースがないため、汎用のリクエストメソッドを使う
+        if method == "post":
+            response = self.client.post(path, body=body, cast_to=httpx.Response)
+        else:
+            response = self.client.get(path, cast_to=httpx.Response)
+        return response.json()
+
+
+class LocalBatchBackend:
+    """Batch APIの代わりに手元で処理するバックエンド（ネットワークなしでの動作確認用）
+
+    handler(body) はChat Completions APIのレスポンスと同じ形式の辞書を返す関数。
+    入出力のファイル形式はBatch APIと同じため、呼び出し側の処理はそのまま検証できる。
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        self._batches = {}
+        self._files = {}
+
+    def create_batch(self, input_jsonl):
+        output_lines = []
+        error_lines = []
+        for line in input_jsonl.splitlines():
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            try:
+                body = self.handler(request["body"])
+                output_lines.append({
+                    "id": f"batch_req_{uuid.uuid4().hex}",
+                    "custom_id": request["custom_id"],
+                    "response": {"status_code": 200, "body": body},
+                    "error": None
+                })
+            except Exception as e:
+                error_lines.append({
+                    "id": f"batch_req_{uuid.uuid4().hex}",
+                    "custom_id": request["custom_id"],
+                    "response": None,
+                    "error": {"message": str(e)}
+                })
+
+        batch_id = f"batch_local_{uuid.uuid4().hex}"
+        self._batches[batch_id] = {
+            "id": batch_id,
+            "status": "completed",
+            "output_file_id": self._store_file(output_lines),
+            "error_file_id": self._store_file(error_lines) if error_lines else None,
+            "request_counts": {
+                "total": len(output_lines) + len(error_lines),
+                "completed": len(output_lines),
+                "failed": len(error_lines)
+            }
+        }
+        return batch_id
+
+    def retrieve_batch(self, batch_id):
+        return self._batches[batch_id]
+
+    def download_file(self, file_id):
+        return self._files[file_id]
+
+    def _store_file(self, lines):
+        file_id = f"file_local_{uuid.uuid4().hex}"
+        self._files[file_id] = "\n".join(json.dumps(line, ensure_ascii=False) for line in lines)
+        return file_id
+
+
+def chat_completion_handler(client):
+    """LocalBatchBackend用: 各リクエストを通常のChat Completions APIで処理するハンドラー"""
+    return lambda body: client.chat.completions.create(**body).model_dump()
+
+
+def run_batch(backend, lines, poll_interval=60, timeout=24 * 3600, on_status=None):
+    """リクエスト一覧をバッチ送信し、完了を待って {custom_id: 応答テキスト} を返す"""
+    input_jsonl = "\n".join(json.dumps(line, ensure_ascii=False) for line in lines)
+    batch_id = backend.create_batch(input_jsonl)
+
+    deadline = time.monotonic() + timeout
+    while True:
+        batch = backend.retrieve_batch(batch_id)
+        if on_status:
+            on_status(batch)
+        if batch.get("status") in TERMINAL_STATUSES:
+            break
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"バッチ {batch_id} が {timeout} 秒以内に完了しませんでした")
+        time.sleep(poll_interval)
+
+    # 期限切れの場合も完了済みのリクエストは出力ファイルに含まれる
+    output_file_id = batch.get("output_file_id")
+    if not output_file_id:
+        raise RuntimeError(f"バッチ {batch_id} の処理に失敗しました（状態: {batch.get('status')}）")
+    return parse_batch_output(backend.download_file(output_file_id))
+
+
+def parse_batch_output(output_jsonl):
+    """バッチ出力ファイル（JSONL）から {custom_id: 応答テキスト} を取り出す"""
+    results = {}
+    for line in output_jsonl.splitlines():
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        response = item.get("response") or {}
+        if response.get("status_code") != 200:
+            continue
+        choices = (response.get("body") or {}).get("choices") or []
+        if choices:
+            results[item["custom_id"]] = choices[0]["message"]["content"]
+    return results
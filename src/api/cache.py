@@ -0,0 +1,142 @@
+"""
+API応答をローカルに保存するキャッシュモジュール（SQLite）
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(PROJECT_ROOT, ".cache"))
+
+# 何回の書き込みごとに期限切れ・容量超過の掃除を行うか
+_EVICT_EVERY = 50
+
+
+class SQLiteCache:
+    """入力内容のハッシュをキーにしたディスクキャッシュ（スレッドセーフ）"""
+
+    def __init__(self, path, table, max_entries=20000, max_bytes=500 * 1024 * 1024, max_age_seconds=30 * 24 * 3600):
+        self.path = path
+        self.table = table
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed_at ON {table} (accessed_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(*parts):
+        """キャッシュキー（入力一式のSHA-256）を作成"""
+        payload = json.dumps(parts, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """キャッシュを取得（なければNone）"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.max_age_seconds:
+                self.misses += 1
+                return None
+            self._conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, key, value):
+        """キャッシュを保存"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value.encode("utf-8")), now, now)
+            )
+            self._conn.commit()
+            self._writes += 1
+            if self._writes % _EVICT_EVERY == 0:
+                self._evict(now)
+
+    def evict(self):
+        """期限切れのエントリと、件数・容量の上限を超えた古いエントリを削除"""
+        with self._lock:
+            self._evict(time.time())
+
+    def _evict(self, now):
+        self._conn.execute(f"DELETE FROM {self.table} WHERE created_at < ?", (now - self.max_age_seconds,))
+        count, total_bytes = self._conn.execute(
+            f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.table}"
+        ).fetchone()
+        if count > self.max_entries or total_bytes > self.max_bytes:
+            # 最近使われていないものから削除
+            rows = self._conn.execute(
+                f"SELECT key, size FROM {self.table} ORDER BY accessed_at"
+            ).fetchall()
+            stale_keys = []
+            for key, size in rows:
+                if count <= self.max_entries and total_bytes <= self.max_bytes:
+                    break
+                stale_keys.append((key,))
+                count -= 1
+                total_bytes -= size
+            self._conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", stale_keys)
+        self._conn.commit()
+
+    def stats(self):
+        """ヒット/ミス数と保存件数・容量を取得"""
+        with self._lock:
+            count, total_bytes = self._conn.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.table}"
+            ).fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": count, "bytes": total_bytes}
+
+
+_llm_cache = None
+_transcript_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache():
+    """プロセス全体で共有するLLM応答キャッシュを取得"""
+    global _llm_cache
+    with _cache_lock:
+        if _llm_cache is None:
+            _llm_cache = SQLiteCache(
+                os.getenv("LLM_CACHE_PATH", os.path.join(CACHE_DIR, "llm_cache.sqlite3")),
+                "llm_responses",
+                max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "20000")),
+                max_age_seconds=int(os.getenv("LLM_CACHE_MAX_AGE_DAYS", "30")) * 24 * 3600,
+            )
+        return _llm_cache
+
+
+def get_transcript_cache():
+    """プロセス全体で共有する文字起こし結果キャッシュを取得"""
+    global _transcript_cache
+    with _cache_lock:
+        if _transcript_cache is None:
+            _transcript_cache = SQLiteCache(
+                os.getenv("TRANSCRIPT_CACHE_PATH", os.path.join(CACHE_DIR, "transcripts.sqlite3")),
+                "transcripts",
+                max_entries=int(os.getenv("TRANSCRIPT_CACHE_MAX_ENTRIES", "5000")),
+                max_age_seconds=int(os.getenv("TRANSCRIPT_CACHE_MAX_AGE_DAYS", "90")) * 24 * 3600,
+            )
+        return _transcript_cache
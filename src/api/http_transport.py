@@ -0,0 +1,77 @@
+"""
+OpenAI・Google Sheets の通信で共有するHTTP接続の設定モジュール
+
+接続プールの大きさを並列処理のワーカー数に合わせ、keep-alive で接続を再利用することで
+同時実行時のTLSハンドシェイクと接続待ちを減らす。
+"""
+
+import importlib.util
+import os
+import threading
+import httpx
+from requests.adapters import HTTPAdapter
+from src.utils.text_chunker import MAX_CHUNK_WORKERS
+
+# 品質チェックで同時に処理する会話記録の上限（画面の「同時処理数」の上限）
+MAX_CONCURRENT_ROWS = int(os.getenv("MAX_CONCURRENT_ROWS", "10"))
+# 1件の会話記録が同時に送るリクエスト数（並列チェック4ノード、またはチャンクの並列数）
+_REQUESTS_PER_ROW = max(4, MAX_CHUNK_WORKERS)
+# 文字起こしなど品質チェック以外のリクエスト用の余裕
+_EXTRA_CONNECTIONS = 8
+# 同時に使用する接続数の上限（未設定の場合は同時処理数の上限から求める）
+HTTP_MAX_CONNECTIONS = int(
+    os.getenv("HTTP_MAX_CONNECTIONS") or MAX_CONCURRENT_ROWS * _REQUESTS_PER_ROW + _EXTRA_CONNECTIONS
+)
+# 使い終わった接続を keep-alive で保持する時間（秒）
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+# 接続・読み取りのタイムアウト（秒）。読み取りは長い音声の文字起こしを考慮して長めにする
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "300"))
+# 空き接続を待つ時間（秒）。未設定の場合は空くまで待つ
+# （接続待ちは相手の応答待ちとは別のため、接続タイムアウトと共用すると遅い応答の後ろで失敗扱いになる）
+HTTP_POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT")) if os.getenv("HTTP_POOL_TIMEOUT") else None
+# HTTP/2 を使うか（h2 パッケージがインストールされている場合のみ有効）
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "1") != "0"
+
+_http_client = None
+_http_client_lock = threading.Lock()
+
+
+def is_http2_available():
+    """HTTP/2 を使用できるか（httpx の HTTP/2 対応には h2 パッケージが必要）"""
+    return HTTP2_ENABLED and importlib.util.find_spec("h2") is not None
+
+
+def get_http_client():
+    """プロセス全体で共有するOpenAI用のHTTPクライアントを取得（Whisper・チャットで共用）"""
+    global _http_client
+    with _http_client_lock:
+        if _http_client is None:
+            _http_client = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+                    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+                ),
+                timeout=httpx.Timeout(
+                    connect=HTTP_CONNECT_TIMEOUT,
+                    read=HTTP_READ_TIMEOUT,
+                    write=HTTP_READ_TIMEOUT,
+                    pool=HTTP_POOL_TIMEOUT
+                ),
+                http2=is_http2_available()
+            )
+        return _http_client
+
+
+def configure_requests_session(session, pool_size=HTTP_MAX_CONNECTIONS):
+    """requests のセッション（gspread が使用）の接続プールをワーカー数に合わせて設定"""
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_requests_timeout():
+    """requests に渡す (接続, 読み取り) のタイムアウト"""
+    return HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT
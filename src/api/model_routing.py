@@ -0,0 +1,41 @@
+"""
+ワークフローのノードごとに使用するチャットモデルを決めるモジュール
+
+各ノードは通常モデルで実行し、出力が検証に通らない場合のみ上位モデルで再実行する。
+モデル名は環境変数 NODE_MODEL_<ノード名>（例: NODE_MODEL_REPLACE）と
+NODE_ESCALATION_MODEL_<ノード名> で個別に上書きできる。
+"""
+
+import os
+
+# 置換・話者分離・JSON変換などの機械的なノード向け（安価・高速）
+FAST_CHAT_MODEL = os.getenv("FAST_CHAT_MODEL", "gpt-4o-mini")
+# ルール判定を行うチェックノード向け
+CHECK_CHAT_MODEL = os.getenv("CHECK_CHAT_MODEL", "gpt-4o-mini")
+# 出力が検証に通らなかった場合に再実行する上位モデル
+ESCALATION_CHAT_MODEL = os.getenv("ESCALATION_CHAT_MODEL", "gpt-4o")
+
+_NODE_DEFAULT_MODELS = {
+    'replace': FAST_CHAT_MODEL,
+    'speaker': FAST_CHAT_MODEL,
+    'to_json': FAST_CHAT_MODEL,
+    'company_name_check': CHECK_CHAT_MODEL,
+    'teleapo_response_check': CHECK_CHAT_MODEL,
+    'longcall_check': CHECK_CHAT_MODEL,
+    'customer_reaction_check': CHECK_CHAT_MODEL,
+    'manner_check': CHECK_CHAT_MODEL,
+    'combined_check': CHECK_CHAT_MODEL,
+}
+
+
+def get_node_model(node_name):
+    """ノードの通常モデルを取得"""
+    return os.getenv(f"NODE_MODEL_{node_name.upper()}", _NODE_DEFAULT_MODELS.get(node_name, CHECK_CHAT_MODEL))
+
+
+def get_escalation_model(node_name):
+    """ノードの再実行用の上位モデルを取得（通常モデルと同じ場合はNone）"""
+    model = os.getenv(f"NODE_ESCALATION_MODEL_{node_name.upper()}", ESCALATION_CHAT_MODEL)
+    if not model or model == get_node_model(node_name):
+        return None
+    return model
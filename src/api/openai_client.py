@@ -3,9 +3,28 @@ OpenAI APIとの通信を行うクライアントモジュール
 """
 
 import os
+import json
+import hashlib
+import openai
 from openai import OpenAI
 import streamlit as st
 import time
+from src.api.cache import get_llm_cache, get_transcript_cache
+from src.api.rate_limiter import get_rate_limiter, estimate_tokens, parse_retry_after, backoff_delay
+from src.utils.audio_splitter import split_mp3, merge_transcripts, MemoryViewReader
+from src.utils.parallel import run_parallel
+from src.api.http_transport import get_http_client
+from src.api.usage_tracker import record_call
+from src.utils.tracing import traced
+
+# 品質チェックで使用するチャットモデル
+DEFAULT_CHAT_MODEL = "gpt-4o-mini"
+# Whisper APIのアップロード上限（25MB）に対する余裕を持たせた閾値
+WHISPER_MAX_FILE_BYTES = 24 * 1024 * 1024
+# 分割文字起こしの区間長・重なり・同時実行数
+SEGMENT_SECONDS = int(os.getenv("TRANSCRIPTION_SEGMENT_SECONDS", "300"))
+SEGMENT_OVERLAP_SECONDS = int(os.getenv("TRANSCRIPTION_OVERLAP_SECONDS", "5"))
+TRANSCRIPTION_WORKERS = int(os.getenv("TRANSCRIPTION_WORKERS", "4"))
 
 def init_openai_client():
     """OpenAI クライアントを初期化"""
@@ -42,32 +61,10 @@ def init_openai_client():
         st.write(f"DEBUG: APIキーの長さ: {len(api_key) if api_key else 0}")
         
         try:
-            # OpenAIクライアントの初期化（必要最小限のパラメータのみ）
-            client = OpenAI(
-                api_key=api_key,
-                # timeout=60,  # 必要に応じてタイムアウトを設定
-            )
+            # クライアントはプロセス内で1度だけ作成し、全セッション・全再実行で共有する
+            # （接続確認は check_openai_connection で必要なときだけ行う）
+            return _create_openai_client(api_key)
             
-            # 簡単な接続テスト（models.listは重いのでより軽いテストに変更）
-            try:
-                # より軽量なテスト：短いチャット応答で接続確認
-                test_response = client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[{"role": "user", "content": "test"}],
-                    max_tokens=1,
-                    temperature=0
-                )
-                
-                # 成功メッセージ
-                st.success("✅ OpenAI APIに正常に接続しました")
-                return client
-                
-            except Exception as connection_error:
-                # 接続テストが失敗した場合でも、クライアント自体は返す
-                # （実際の使用時にエラーハンドリングする）
-                st.warning(f"⚠️ 接続テストは失敗しましたが、クライアントを作成しました: {str(connection_error)}")
-                return client
-                
         except TypeError as type_error:
             # TypeError が発生した場合（proxiesパラメータなど）
             if "unexpected keyword argument" in str(type_error):
@@ -111,23 +108,87 @@ def init_openai_client():
         st.write(f"DEBUG: エラー詳細: {str(e)}")
         st.stop()
 
-def chat_with_retry(client, system_prompt, user_prompt, temperature=0.0, expect_json=False, model="gpt-4o-mini", max_retries=3):
-    """OpenAI Chat APIを使用してプロンプトの応答を取得（リトライ機能付き）"""
+@st.cache_resource(show_spinner=False)
+def _create_openai_client(api_key):
+    """OpenAI クライアントを作成（st.cache_resourceによりプロセス内で共有）"""
+    return OpenAI(
+        api_key=api_key,
+        # 接続プール・keep-alive・タイムアウトを設定した共有のHTTPクライアントを使用する
+        http_client=get_http_client(),
+    )
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _probe_openai_connection(_client, model):
+    """モデル情報の取得で接続を確認（課金対象のリクエストは送らない）"""
+    try:
+        _client.models.retrieve(model)
+        return True, "OpenAI APIに正常に接続しました"
+    except Exception as e:
+        return False, f"OpenAI APIの接続確認に失敗しました: {str(e)}"
+
+def check_openai_connection(client, model=DEFAULT_CHAT_MODEL):
+    """OpenAI APIの接続確認（結果は5分間キャッシュ）"""
+    return _probe_openai_connection(client, model)
+
+@traced("chat_completion")
+def chat_with_retry(client, system_prompt, user_prompt, temperature=0.0, expect_json=False, model=DEFAULT_CHAT_MODEL, max_retries=3, use_cache=True, response_format=None, node=None):
+    """OpenAI Chat APIを使用してプロンプトの応答を取得（キャッシュ・レート制限・リトライ機能付き）
+
+    expect_json=True の場合はAPIのJSONモードを使用し、パース済みのオブジェクトを返す。
+    response_format を指定するとAPIの構造化出力（JSONスキーマ等）を使用する。
+    node にはワークフローのノード名を渡す（プロンプトキャッシュの適用状況をノード別に記録する）。
+    """
+    # 出力が決定的な temperature=0 の呼び出しのみキャッシュする（use_cache=False で常に再計算）
+    cache = get_llm_cache() if use_cache and temperature == 0 else None
+    cache_key = None
+    if cache is not None:
+        cache_key = cache.make_key(model, system_prompt, user_prompt, temperature, expect_json, response_format)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            record_call(node, model, cache_hit=True)
+            return _parse_json_content(cached) if expect_json else cached
+    
+    limiter = get_rate_limiter(model)
+    estimated_tokens = estimate_tokens(system_prompt) + estimate_tokens(user_prompt)
+    # リトライはこの関数で一元管理するため、SDK側の自動リトライは無効化する
+    request_client = client.with_options(max_retries=0)
+    if response_format is None and expect_json:
+        response_format = {"type": "json_object"}
+    request_options = {"response_format": response_format} if response_format else {}
     retry_count = 0
-    while retry_count < max_retries:
+    started = time.monotonic()
+    while True:
+        limiter.acquire(estimated_tokens)
         try:
-            response = client.chat.completions.create(
+            raw_response = request_client.chat.completions.with_raw_response.create(
                 model=model,
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_prompt}
                 ],
-                temperature=temperature
+                temperature=temperature,
+                **request_options
             )
-            return response.choices[0].message.content
+            limiter.update_from_headers(raw_response.headers)
+            response = raw_response.parse()
+            content = response.choices[0].message.content
+            record_call(node, model, response.usage, time.monotonic() - started, retry_count)
+            break
         except Exception as e:
             retry_count += 1
-            if retry_count == max_retries:
+            headers = getattr(getattr(e, 'response', None), 'headers', None)
+            limiter.update_from_headers(headers)
+            
+            if not _is_retryable_error(e) or retry_count >= max_retries:
+                record_call(node, model, latency_seconds=time.monotonic() - started, retries=retry_count - 1, success=False)
+            if not _is_retryable_error(e):
+                st.markdown(f"""
+                <div class="error-box">
+                  ❌ APIリクエストに失敗しました（リトライ不可のエラー）: {str(e)}
+                </div>
+                """, unsafe_allow_html=True)
+                return None
+            if retry_count >= max_retries:
                 st.markdown(f"""
                 <div class="error-box">
                   ❌ APIリクエストに失敗しました（{max_retries}回試行）: {str(e)}
@@ -139,47 +200,124 @@ def chat_with_retry(client, system_prompt, user_prompt, temperature=0.0, expect_
               ⚠️ APIリクエストに失敗しました。リトライします ({retry_count}/{max_retries})...
             </div>
             """, unsafe_allow_html=True)
-            time.sleep(1)  # リトライ前に少し待機
-
-def transcribe_audio(audio_file, client):
-    """音声ファイルを文字起こし"""
-    import tempfile
+            
+            retry_after = parse_retry_after(headers)
+            if retry_after is not None:
+                # サーバーの指示は同じモデルを使う全スレッドに適用する
+                limiter.pause(retry_after)
+            else:
+                time.sleep(backoff_delay(retry_count))
+    
+    if expect_json:
+        parsed = _parse_json_content(content)
+        if parsed is None:
+            st.markdown(f"""
+            <div class="error-box">
+              ❌ APIの応答が有効なJSONではありません: {str(content)[:200]}
+            </div>
+            """, unsafe_allow_html=True)
+            return None
+    if cache is not None and content:
+        cache.set(cache_key, content)
+    return parsed if expect_json else content
 
-    tmp_file_path = None
+def _parse_json_content(content):
+    """応答テキストをJSONとしてパース（失敗時はNone）"""
     try:
+        return json.loads(content)
+    except (TypeError, ValueError):
+        return None
+
+def _is_retryable_error(error):
+    """一時的なエラー（レート制限・タイムアウト・接続断・サーバーエラー）かどうかを判定"""
+    if isinstance(error, openai.RateLimitError):
+        # クォータ枯渇は待っても回復しない
+        return getattr(error, 'code', None) != "insufficient_quota"
+    if isinstance(error, (openai.APIConnectionError, openai.InternalServerError, openai.ConflictError)):
+        return True
+    return False
+
+def transcribe_audio(audio_file, client, model="whisper-1", language="ja", use_cache=True, chunked=None):
+    """音声ファイルを文字起こし（同一音声は保存済みの結果を返す）"""
+    # アップロード済みのバッファをコピーせずに参照する（一時ファイルも作らない）
+    with audio_file.getbuffer() as audio_buffer:
+        # 音声データのハッシュ＋モデル＋言語をキーにキャッシュを確認
+        cache = get_transcript_cache() if use_cache else None
+        cache_key = None
+        if cache is not None:
+            cache_key = cache.make_key(hashlib.sha256(audio_buffer).hexdigest(), model, language)
+            cached = cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        # 上限を超えるファイルは自動的に分割モードにする
+        if chunked is None:
+            chunked = audio_buffer.nbytes > WHISPER_MAX_FILE_BYTES
+
         # 処理ステータス表示
         status_msg = st.empty()
-        status_msg.markdown("""
+        status_msg.markdown(f"""
         <div class="info-box">
-          🎤 音声ファイルを文字起こし中です。これには数分かかる場合があります...
+          🎤 音声ファイルを{"分割して並列で" if chunked else ""}文字起こし中です。これには数分かかる場合があります...
         </div>
         """, unsafe_allow_html=True)
         
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as tmp_file:
-            tmp_file.write(audio_file.getvalue())
-            tmp_file_path = tmp_file.name
-        
-        with open(tmp_file_path, "rb") as audio:
-            try:
+        try:
+            if chunked:
+                transcript = _transcribe_in_segments(audio_buffer, client, model, language)
+            else:
+                started = time.monotonic()
                 transcript = client.audio.transcriptions.create(
-                    file=audio,
-                    model="whisper-1",
-                    language="ja",
+                    file=(audio_file.name or "audio.mp3", MemoryViewReader(audio_buffer)),
+                    model=model,
+                    language=language,
                     response_format="text"
                 )
-                
-                # 完了表示をクリア
-                status_msg.empty()
-                return transcript
-            except Exception as e:
-                status_msg.markdown(f"""
-                <div class="error-box">
-                  ❌ 文字起こし処理に失敗しました: {str(e)}
-                </div>
-                """, unsafe_allow_html=True)
-                st.write(f"DEBUG: 文字起こしエラー詳細: {str(e)}")
-                return None
-    finally:
-        # 一時ファイルの削除
-        if tmp_file_path and os.path.exists(tmp_file_path):
-            os.unlink(tmp_file_path)
\ No newline at end of file
+                record_call("transcribe", model, latency_seconds=time.monotonic() - started)
+            
+            if cache is not None and transcript:
+                cache.set(cache_key, transcript)
+            
+            # 完了表示をクリア
+            status_msg.empty()
+            return transcript
+        except Exception as e:
+            status_msg.markdown(f"""
+            <div class="error-box">
+              ❌ 文字起こし処理に失敗しました: {str(e)}
+            </div>
+            """, unsafe_allow_html=True)
+            st.write(f"DEBUG: 文字起こしエラー詳細: {str(e)}")
+            return None
+
+def _transcribe_in_segments(audio_buffer, client, model, language,
+                            segment_seconds=SEGMENT_SECONDS, overlap_seconds=SEGMENT_OVERLAP_SECONDS):
+    """長い録音を重なりのある区間に分割して並列に文字起こしし、1つの文字起こしに結合"""
+    segments = split_mp3(audio_buffer, segment_seconds=segment_seconds, overlap_seconds=overlap_seconds)
+    if not segments:
+        raise ValueError("MP3フレームを検出できなかったため、音声を分割できませんでした")
+    
+    limiter = get_rate_limiter(model)
+    
+    def _transcribe_segment(index, start, end):
+        limiter.acquire()
+        started = time.monotonic()
+        transcript = client.audio.transcriptions.create(
+            file=(f"segment_{index:03d}.mp3", MemoryViewReader(audio_buffer[start:end])),
+            model=model,
+            language=language,
+            response_format="text"
+        )
+        record_call("transcribe", model, latency_seconds=time.monotonic() - started)
+        return transcript
+    
+    tasks = {
+        index: (lambda index=index, start=start, end=end: _transcribe_segment(index, start, end))
+        for index, (start, end) in enumerate(segments)
+    }
+    results = run_parallel(tasks, max_workers=TRANSCRIPTION_WORKERS)
+    # 重なり部分（約overlap_seconds秒分）の重複テキストを除去して結合
+    return merge_transcripts(
+        [results[index] for index in range(len(segments))],
+        window=max(100, overlap_seconds * 30)
+    )
@@ -0,0 +1,152 @@
+"""
+OpenAI APIのレート制限（RPM/TPM）を管理するモジュール
+"""
+
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+# レスポンスヘッダーが得られるまでの初期値（1分あたり）
+DEFAULT_RPM_LIMIT = int(os.getenv("OPENAI_RPM_LIMIT", "500"))
+DEFAULT_TPM_LIMIT = int(os.getenv("OPENAI_TPM_LIMIT", "200000"))
+
+
+class TokenBucket:
+    """一定速度で補充されるトークンバケット（スレッドセーフ）"""
+
+    def __init__(self, capacity, refill_per_second):
+        self.capacity = float(capacity)
+        self.refill_per_second = float(refill_per_second)
+        self.tokens = float(capacity)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated_at
+        self._updated_at = now
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_per_second)
+
+    def try_acquire(self, amount=1):
+        """取得できれば0を、できなければ必要な待ち時間（秒）を返す"""
+        with self._lock:
+            self._refill()
+            # 容量を超える要求は満タンになった時点で通す
+            amount = min(amount, self.capacity)
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return 0.0
+            return (amount - self.tokens) / self.refill_per_second
+
+    def acquire(self, amount=1):
+        """トークンが取得できるまで待機"""
+        while True:
+            wait = self.try_acquire(amount)
+            if wait <= 0:
+                return
+            time.sleep(min(wait, 1.0))
+
+    def sync(self, limit=None, remaining=None):
+        """サーバーが返した上限・残量にバケットを合わせる"""
+        with self._lock:
+            self._refill()
+            if limit:
+                self.capacity = float(limit)
+                self.refill_per_second = float(limit) / 60
+            if remaining is not None:
+                self.tokens = min(self.tokens, float(remaining), self.capacity)
+
+
+class RateLimiter:
+    """リクエスト数とトークン数の2つのバケットで送信ペースを制御する"""
+
+    def __init__(self, rpm=DEFAULT_RPM_LIMIT, tpm=DEFAULT_TPM_LIMIT):
+        self.requests = TokenBucket(rpm, rpm / 60)
+        self.tokens = TokenBucket(tpm, tpm / 60)
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, estimated_tokens=0):
+        """送信可能になるまで待機"""
+        while True:
+            with self._lock:
+                wait = self._blocked_until - time.monotonic()
+            if wait <= 0:
+                break
+            time.sleep(wait)
+        self.requests.acquire(1)
+        if estimated_tokens:
+            self.tokens.acquire(estimated_tokens)
+
+    def pause(self, seconds):
+        """retry-after などの指示に従い、全スレッドの送信を一時停止する"""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    def update_from_headers(self, headers):
+        """x-ratelimit-* ヘッダーから上限と残量を反映"""
+        if not headers:
+            return
+        self.requests.sync(
+            limit=_parse_int(headers.get("x-ratelimit-limit-requests")),
+            remaining=_parse_int(headers.get("x-ratelimit-remaining-requests")),
+        )
+        self.tokens.sync(
+            limit=_parse_int(headers.get("x-ratelimit-limit-tokens")),
+            remaining=_parse_int(headers.get("x-ratelimit-remaining-tokens")),
+        )
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(model):
+    """モデルごとに共有されるレートリミッターを取得（レート制限はモデル単位）"""
+    with _limiters_lock:
+        if model not in _limiters:
+            _limiters[model] = RateLimiter()
+        return _limiters[model]
+
+
+def estimate_tokens(text):
+    """トークン数の概算（日本語は概ね1文字1トークン以下なので文字数で上限を見積もる）"""
+    return len(text) if text else 0
+
+
+def parse_retry_after(headers):
+    """retry-after-ms / retry-after ヘッダーから待機秒数を取得"""
+    if not headers:
+        return None
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    return None
+
+
+def backoff_delay(attempt, base=1.0, cap=30.0):
+    """ジッター付き指数バックオフの待機秒数"""
+    delay = min(cap, base * (2 ** (attempt - 1)))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def _parse_int(value):
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
@@ -3,13 +3,76 @@ Google Sheetsとの連携を行うモジュール
 """
 
 import os
+import re
 import json
 import streamlit as st
 import gspread
-from gspread import Cell
+from gspread.utils import rowcol_to_a1
 from google.oauth2.service_account import Credentials
 from datetime import datetime
+import threading
 import time
+import logging
+from src.api.cache import CACHE_DIR
+from src.api.http_transport import configure_requests_session, get_requests_timeout
+from src.api.sheets_quota import governed_call
+from src.utils.tracing import traced, set_span_attributes
+
+logger = logging.getLogger(__name__)
+
+# 対象のスプレッドシートとワークシート（SPREADSHEET_KEY を設定するとタイトル検索を省略できる）
+SPREADSHEET_TITLE = "テレアポチェックシート"
+WORKSHEET_TITLE = "Difyテスト"
+SPREADSHEET_KEY = os.getenv("SPREADSHEET_KEY")
+
+# 未処理行の走査でB〜D列を一度に読む行数と、前回の走査位置の保存先
+SCAN_PAGE_ROWS = int(os.getenv("SHEET_SCAN_PAGE_ROWS", "500"))
+SCAN_STATE_PATH = os.path.join(CACHE_DIR, "sheet_scan_state.json")
+# 前回の走査位置より上の行（D列を消して再チェックする行など）も拾うため、先頭から走査し直す間隔（秒）
+FULL_SCAN_INTERVAL_SECONDS = float(os.getenv("SHEET_FULL_SCAN_INTERVAL", "3600"))
+_scan_state_lock = threading.Lock()
+# 会話記録（A列）の取得で1回のリクエストに含める範囲の最大数（URLが長くなりすぎないようにする）
+TRANSCRIPT_RANGES_PER_REQUEST = 50
+# 文字起こし結果を1回の追記リクエストで書き込む最大行数
+APPEND_BATCH_ROWS = int(os.getenv("SHEET_APPEND_BATCH_ROWS", "20"))
+
+# 品質チェック結果の列名と列番号（実際のスプレッドシートの列名に合わせる）
+RESULT_HEADER_MAP = {
+    # A列「会話記録」、B列「ファイル名」、C列「処理日時」は品質チェック結果では更新しない
+    "テレアポ担当者名": 4,  # D列
+    "報告まとめ": 5,  # E列
+    "社名や担当者名を名乗らない": 6,  # F列
+    "アプローチで販売店名、ソフト名の先出し": 7,  # G列
+    "同業他社の悪口等": 8,  # H列
+    "運転中や電車内でも無理やり続ける": 9,  # I列
+    "2回断られても食い下がる": 10,  # J列
+    "暴言・悪口・脅迫・逆上": 11,  # K列
+    "情報漏洩": 12,  # L列
+    "共犯（教唆・幇助）": 13,  # M列
+    "通話対応（無言電話／ガチャ切り）": 14,  # N列
+    "呼び方": 15,  # O列
+    "ロングコール": 16,  # P列
+    "ガチャ切りされた△": 17,  # Q列
+    "当社の電話お断り": 18,  # R列
+    "しつこい・何度も電話がある": 19,  # S列
+    "お客様専用電話番号と言われる": 20,  # T列
+    "口調を注意された": 21,  # U列
+    "怒らせた": 22,  # V列
+    "暴言を受けた": 23,  # W列
+    "通報する": 24,  # X列
+    "営業お断り": 25,  # Y列
+    "事務員に対して代表者のことを「社長」「オーナー」「代表」": 26,  # Z列
+    "一人称が「僕」「自分」「俺」": 27,  # AA列
+    "「弊社」のことを「うち」「僕ら」と言う": 28,  # AB列
+    "謝罪が「すみません」「ごめんなさい」": 29,  # AC列
+    "口調や態度が失礼": 30,  # AD列
+    "会話が成り立っていない": 31,  # AE列
+    "残債の「下取り」「買い取り」トーク": 32,  # AF列
+    "嘘・真偽不明": 33,  # AG列
+    "その他問題": 34,  # AH列
+}
+RESULT_FIRST_COLUMN = min(RESULT_HEADER_MAP.values())
+RESULT_LAST_COLUMN = max(RESULT_HEADER_MAP.values())
 
 def init_google_sheets():
     """Google Sheets クライアントを初期化"""
@@ -55,20 +118,9 @@ def init_google_sheets():
             st.stop()
 
         try:
-            gc = gspread.authorize(credentials)
-            
-            # スプレッドシートの存在確認
-            try:
-                spreadsheet = gc.open("テレアポチェックシート")
-                worksheet = spreadsheet.worksheet("Difyテスト")
-                return gc
-            except Exception as e:
-                st.markdown(f"""
-                <div class="error-box">
-                  ❌ スプレッドシートへのアクセスエラー: {str(e)}
-                </div>
-                """, unsafe_allow_html=True)
-                st.stop()
+            # 認証済みクライアントはプロセス内で共有し、再実行ごとの再認証を避ける
+            # （スプレッドシートの存在確認は check_sheets_connection で必要なときだけ行う）
+            return _authorize_gspread(credentials)
 
         except Exception as e:
             st.markdown(f"""
@@ -86,189 +138,307 @@ def init_google_sheets():
         """, unsafe_allow_html=True)
         st.stop()
 
-def write_to_sheets(gc, transcript_text, filename):
-    """Google Sheetsに文字起こし結果を書き込む"""
+@st.cache_resource(show_spinner=False)
+def _authorize_gspread(_credentials):
+    """gspreadクライアントを作成（st.cache_resourceによりプロセス内で共有）"""
+    gc = gspread.authorize(_credentials)
+    # 並列処理時に接続を使い回せるよう、接続プールとタイムアウトをOpenAIの通信と揃える
+    configure_requests_session(gc.session)
+    gc.set_timeout(get_requests_timeout())
+    return gc
+
+_worksheet_handles = {}
+_resolved_spreadsheet_keys = {}
+_handle_lock = threading.Lock()
+
+def get_worksheet(gc, spreadsheet_title=SPREADSHEET_TITLE, worksheet_title=WORKSHEET_TITLE):
+    """ワークシートを取得（一度開いたものはプロセス内で再利用する）
+
+    タイトルでの検索はDrive APIの検索を伴うため、キー（SPREADSHEET_KEY または前回解決したID）が
+    分かっている場合はキーで開く。
+    """
+    handle_key = (spreadsheet_title, worksheet_title)
+    with _handle_lock:
+        cached = _worksheet_handles.get(handle_key)
+        if cached is not None and cached[0] is gc:
+            return cached[1]
+        spreadsheet_key = _resolved_spreadsheet_keys.get(spreadsheet_title)
+    if spreadsheet_title == SPREADSHEET_TITLE and SPREADSHEET_KEY:
+        spreadsheet_key = SPREADSHEET_KEY
+    
+    if spreadsheet_key:
+        spreadsheet = governed_call("read", gc.open_by_key, spreadsheet_key)
+    else:
+        spreadsheet = governed_call("read", gc.open, spreadsheet_title)
+    worksheet = governed_call("read", spreadsheet.worksheet, worksheet_title)
+    with _handle_lock:
+        _resolved_spreadsheet_keys[spreadsheet_title] = spreadsheet.id
+        _worksheet_handles[handle_key] = (gc, worksheet)
+    return worksheet
+
+def invalidate_worksheet(spreadsheet_title=SPREADSHEET_TITLE, worksheet_title=WORKSHEET_TITLE):
+    """キャッシュしたワークシートを破棄（エラー時に呼び、次回は開き直す）"""
+    with _handle_lock:
+        _worksheet_handles.pop((spreadsheet_title, worksheet_title), None)
+        _resolved_spreadsheet_keys.pop(spreadsheet_title, None)
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _probe_sheets_connection(_gc):
+    """対象スプレッドシートとワークシートにアクセスできるかを確認"""
     try:
-        status_msg = st.empty()
-        status_msg.markdown("""
-        <div class="info-box">
-          🔄 Google Sheetsにデータを保存中...
-        </div>
-        """, unsafe_allow_html=True)
-        
-        # スプレッドシートを開く
-        spreadsheet = gc.open("テレアポチェックシート")
-        worksheet = spreadsheet.worksheet("Difyテスト")
-        
-        # 最終行の次の行を取得
-        next_row = len(worksheet.get_all_values()) + 1
-        
-        # データを書き込む
-        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        cells = [
-            Cell(row=next_row, col=1, value=transcript_text),  # A列: 文字起こしテキスト
-            Cell(row=next_row, col=2, value=filename),         # B列: ファイル名
-            Cell(row=next_row, col=3, value=now)               # C列: 処理日時
-        ]
-        
-        worksheet.update_cells(cells)
-        
-        # 完了後は表示をクリア
-        status_msg.empty()
-        return True
+        get_worksheet(_gc)
+        return True, "Google Sheetsに正常に接続しました"
     except Exception as e:
-        st.markdown(f"""
-        <div class="error-box">
-          ❌ スプレッドシートへの書き込みに失敗しました: {str(e)}
-        </div>
-        """, unsafe_allow_html=True)
-        return False
+        invalidate_worksheet()
+        return False, f"スプレッドシートへのアクセスエラー: {str(e)}"
+
+def check_sheets_connection(gc):
+    """Google Sheetsの接続確認（結果は5分間キャッシュ）"""
+    return _probe_sheets_connection(gc)
 
-def get_target_rows(gc, max_rows=50):
-    """品質チェック対象の行を取得"""
+@traced()
+def append_transcript_rows(gc, records, processed_at=None):
+    """文字起こし結果 [(テキスト, ファイル名), ...] を追記し、書き込まれた行番号の一覧を返す
+
+    書き込み先の行はAPI側で決まるため、最終行を調べるためにシート全体を読む必要がなく、
+    同時に書き込んでも互いに上書きしない。画面表示は行わず、失敗時は例外を送出する。
+    """
+    # A列: 文字起こしテキスト、B列: ファイル名、C列: 処理日時
+    processed_at = processed_at or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    rows = [[transcript_text, filename, processed_at] for transcript_text, filename in records]
+    row_numbers = []
     try:
-        status_msg = st.empty()
-        status_msg.markdown("""
-        <div class="info-box">
-          🔍 品質チェック対象データを取得中...
-        </div>
-        """, unsafe_allow_html=True)
-        
-        spreadsheet = gc.open("テレアポチェックシート")
-        worksheet = spreadsheet.worksheet("Difyテスト")
-        
-        # すべての値を取得
-        all_values = worksheet.get_all_values()
-        
-        # ヘッダー行をスキップ
-        header_row = all_values[0] if all_values else []
-        data_rows = all_values[1:] if len(all_values) > 1 else []
-        
-        # 処理対象の行を抽出
-        target_rows = []
-        for i, row in enumerate(data_rows, start=2):  # ヘッダー行をスキップして2行目から
-            if len(row) >= 1 and row[0].strip() and (len(row) < 4 or not row[3].strip()):
-                # A列にテキストがあり、D列（テレアポ担当者名）がまだ空の行
-                target_rows.append((i, row))
-                if len(target_rows) >= max_rows:
-                    break
-        
-        # 完了後は表示をクリア
-        status_msg.empty()
-        
-        return header_row, target_rows
-    except Exception as e:
-        st.markdown(f"""
-        <div class="error-box">
-          ❌ スプレッドシートからのデータ取得に失敗しました: {str(e)}
-        </div>
-        """, unsafe_allow_html=True)
-        return [], []
+        worksheet = get_worksheet(gc)
+        # 1回のリクエストが大きくなりすぎないよう APPEND_BATCH_ROWS 行ずつ追記
+        for i in range(0, len(rows), APPEND_BATCH_ROWS):
+            # 追記は再送すると行が重複するため、処理前に拒否される429以外では再試行しない
+            response = governed_call(
+                "write", worksheet.append_rows,
+                rows[i:i + APPEND_BATCH_ROWS],
+                idempotent=False,
+                value_input_option="RAW",
+                insert_data_option="INSERT_ROWS",
+                table_range="A1"
+            )
+            row_numbers.extend(parse_updated_rows(response))
+    except Exception:
+        invalidate_worksheet()
+        raise
+    set_span_attributes(rows=len(rows))
+    return row_numbers
+
+def parse_updated_rows(response):
+    """追記APIの応答（updates.updatedRange、例: 'Difyテスト'!A12:C14）から書き込まれた行番号を取り出す"""
+    updated_range = ((response or {}).get("updates") or {}).get("updatedRange", "")
+    match = re.search(r"[A-Z]+(\d+)(?::[A-Z]+(\d+))?$", updated_range)
+    if not match:
+        return []
+    first_row = int(match.group(1))
+    last_row = int(match.group(2) or first_row)
+    return list(range(first_row, last_row + 1))
 
-def update_quality_check_results(worksheet, header_map, results_batch):
-    """品質チェック結果をスプレッドシートに一括更新（Dify互換版）"""
+def _scan_state_key(worksheet):
+    return f"{worksheet.spreadsheet.id}/{worksheet.id}"
+
+def _load_scan_state(worksheet):
+    """前回の走査で記録した (最初の未処理行, 先頭から走査した時刻) を取得（記録がなければ (2, 0)）"""
     try:
-        cells_to_update = []
-        
-        # 実際のスプレッドシートの列名に合わせたヘッダーマップを定義
-        actual_header_map = {
-            # A列「会話記録」、B列「ファイル名」、C列「処理日時」は品質チェック結果では更新しない
-            "テレアポ担当者名": 4,  # D列
-            "報告まとめ": 5,  # E列
-            "社名や担当者名を名乗らない": 6,  # F列
-            "アプローチで販売店名、ソフト名の先出し": 7,  # G列
-            "同業他社の悪口等": 8,  # H列
-            "運転中や電車内でも無理やり続ける": 9,  # I列
-            "2回断られても食い下がる": 10,  # J列
-            "暴言・悪口・脅迫・逆上": 11,  # K列
-            "情報漏洩": 12,  # L列
-            "共犯（教唆・幇助）": 13,  # M列
-            "通話対応（無言電話／ガチャ切り）": 14,  # N列
-            "呼び方": 15,  # O列
-            "ロングコール": 16,  # P列
-            "ガチャ切りされた△": 17,  # Q列
-            "当社の電話お断り": 18,  # R列
-            "しつこい・何度も電話がある": 19,  # S列
-            "お客様専用電話番号と言われる": 20,  # T列
-            "口調を注意された": 21,  # U列
-            "怒らせた": 22,  # V列
-            "暴言を受けた": 23,  # W列
-            "通報する": 24,  # X列
-            "営業お断り": 25,  # Y列
-            "事務員に対して代表者のことを「社長」「オーナー」「代表」": 26,  # Z列
-            "一人称が「僕」「自分」「俺」": 27,  # AA列
-            "「弊社」のことを「うち」「僕ら」と言う": 28,  # AB列
-            "謝罪が「すみません」「ごめんなさい」": 29,  # AC列
-            "口調や態度が失礼": 30,  # AD列
-            "会話が成り立っていない": 31,  # AE列
-            "残債の「下取り」「買い取り」トーク": 32,  # AF列
-            "嘘・真偽不明": 33,  # AG列
-            "その他問題": 34,  # AH列
-        }
-        
-        for row_index, results in results_batch:
-            try:
-                # JSONパースを試行
-                if isinstance(results, str):
-                    # 空文字列チェック
-                    if not results.strip():
-                        st.warning(f"行 {row_index}: 空の結果が返されました")
-                        continue
-                    
-                    # JSON形式かどうかを確認
-                    results = results.strip()
-                    if results.startswith('{') and results.endswith('}'):
-                        try:
-                            results_dict = json.loads(results)
-                        except json.JSONDecodeError as e:
-                            st.warning(f"行 {row_index}: JSON解析エラー - {str(e)}")
-                            # JSONでない場合は、報告まとめ列にテキストとして保存
-                            cells_to_update.append(Cell(row=row_index, col=5, value=results))
-                            continue
-                    else:
-                        # JSON形式でない場合は、報告まとめ列にテキストとして保存
-                        st.info(f"行 {row_index}: テキスト形式の結果を報告まとめ列に保存")
-                        cells_to_update.append(Cell(row=row_index, col=5, value=results))
-                        continue
-                else:
-                    results_dict = results
-                
-                # 実際のヘッダーマップに基づいて各列にデータを配置
-                for header_text, col_index in actual_header_map.items():
-                    if header_text in results_dict:
-                        value = results_dict[header_text]
-                        # リスト型の場合は文字列に変換
-                        if isinstance(value, list):
-                            value = ", ".join(str(item) for item in value)
-                        cells_to_update.append(Cell(row=row_index, col=col_index, value=str(value)))
-                    else:
-                        # 該当するデータがない場合は空文字列
-                        cells_to_update.append(Cell(row=row_index, col=col_index, value=""))
-                
-            except Exception as e:
-                st.error(f"行 {row_index} の結果処理中にエラー: {str(e)}")
-                # エラーの場合も報告まとめ列にエラー情報を記録
-                cells_to_update.append(Cell(row=row_index, col=5, value=f"エラー: {str(e)}"))
-        
-        if cells_to_update:
-            try:
-                # バッチサイズを制限して更新（Google Sheetsの制限対応）
-                batch_size = 100
-                for i in range(0, len(cells_to_update), batch_size):
-                    batch = cells_to_update[i:i + batch_size]
-                    worksheet.update_cells(batch)
-                    time.sleep(1)  # API制限対応
-                
-                st.success(f"✅ {len(results_batch)}件の結果をスプレッドシートに更新しました")
-                return True
-            except Exception as update_error:
-                st.error(f"スプレッドシート更新エラー: {str(update_error)}")
-                return False
+        with open(SCAN_STATE_PATH, "r", encoding="utf-8") as f:
+            state = json.load(f).get(_scan_state_key(worksheet)) or {}
+        if not isinstance(state, dict):
+            # 以前の形式（走査位置のみ）
+            state = {"row": state}
+        return max(2, int(state.get("row", 2))), float(state.get("full_scan_at", 0))
+    except (OSError, ValueError, TypeError, AttributeError):
+        return 2, 0.0
+
+def _save_scan_state(worksheet, row_index, full_scan_at):
+    with _scan_state_lock:
+        try:
+            with open(SCAN_STATE_PATH, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+        state[_scan_state_key(worksheet)] = {"row": row_index, "full_scan_at": full_scan_at}
+        try:
+            os.makedirs(os.path.dirname(SCAN_STATE_PATH), exist_ok=True)
+            with open(SCAN_STATE_PATH, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+        except OSError as e:
+            logger.warning("走査位置の保存に失敗しました: %s", e)
+
+def fetch_row_count(worksheet):
+    """シートの現在の行数を取得
+
+    キャッシュしたワークシートの row_count は開いた時点の値で、append_rows で行が挿入されても
+    更新されないため、走査のたびにシートのプロパティだけを取得し直す。
+    """
+    metadata = governed_call(
+        "read", worksheet.spreadsheet.fetch_sheet_metadata,
+        params={"fields": "sheets.properties(sheetId,gridProperties.rowCount)"}
+    )
+    for sheet in metadata.get("sheets", []):
+        properties = sheet.get("properties", {})
+        if properties.get("sheetId") == worksheet.id:
+            return properties.get("gridProperties", {}).get("rowCount", worksheet.row_count)
+    return worksheet.row_count
+
+def fetch_transcripts(worksheet, row_indexes):
+    """指定した行の会話記録（A列）を {行番号: 値} で返す
+
+    連続する行は A{先頭}:A{末尾} の1つの範囲にまとめ、範囲が多い場合は
+    TRANSCRIPT_RANGES_PER_REQUEST 件ずつに分けて取得する。
+    """
+    blocks = []
+    for row_index in sorted(set(row_indexes)):
+        if blocks and row_index == blocks[-1][1] + 1:
+            blocks[-1][1] = row_index
         else:
-            st.warning("更新するデータがありません")
-            return False
-        
-    except Exception as e:
-        st.error(f"品質チェック結果の更新に失敗しました: {str(e)}")
-        return False 
\ No newline at end of file
+            blocks.append([row_index, row_index])
+    
+    transcripts = {}
+    for i in range(0, len(blocks), TRANSCRIPT_RANGES_PER_REQUEST):
+        chunk = blocks[i:i + TRANSCRIPT_RANGES_PER_REQUEST]
+        value_ranges = governed_call("read", worksheet.batch_get, [f"A{first}:A{last}" for first, last in chunk])
+        for (first, last), value_range in zip(chunk, value_ranges):
+            # 末尾の空の行は応答に含まれない
+            for offset, values in enumerate(value_range[:last - first + 1]):
+                transcripts[first + offset] = values[0] if values else ""
+    return transcripts
+
+def scan_pending_rows(worksheet, max_rows=50, page_rows=SCAN_PAGE_ROWS, full_scan=False):
+    """未処理の行（A列に会話記録があり、D列が空の行）を探して (ヘッダー行, [(行番号, [A, B, C, D]), ...]) を返す
+
+    判定にはB〜D列だけをページ単位で読み、会話記録（A列）は選ばれた行の分だけ取得する。
+    最初の未処理行を記録しておき、次回はその行から走査する。full_scan=True の場合と、
+    前回先頭から走査してから FULL_SCAN_INTERVAL_SECONDS が経過した場合は先頭から走査する。
+    """
+    row_count = fetch_row_count(worksheet)
+    watermark, full_scan_at = _load_scan_state(worksheet)
+    if time.time() - full_scan_at >= FULL_SCAN_INTERVAL_SECONDS:
+        full_scan = True
+    start_row = 2 if full_scan or watermark > row_count else watermark
+    if start_row == 2:
+        full_scan_at = time.time()
+    
+    header_row = []
+    candidates = []
+    first_pending = None
+    scanned_to = start_row - 1
+    row_start = start_row
+    while row_start <= row_count and len(candidates) < max_rows:
+        row_end = min(row_start + page_rows - 1, row_count)
+        ranges = [f"B{row_start}:D{row_end}"]
+        if not header_row:
+            ranges.insert(0, "1:1")
+        value_ranges = governed_call("read", worksheet.batch_get, ranges)
+        if len(ranges) == 2:
+            header_row = value_ranges[0][0] if value_ranges[0] else []
+        page = value_ranges[-1]
+        if not page:
+            # 以降はデータのない行
+            break
+        for offset, values in enumerate(page):
+            row_index = row_start + offset
+            scanned_to = row_index
+            b, c, d = (list(values) + ["", "", ""])[:3]
+            # B列（ファイル名）かC列（処理日時）がある＝会話記録が書き込まれた行
+            if (b.strip() or c.strip()) and not d.strip():
+                candidates.append((row_index, b, c, d))
+                if len(candidates) >= max_rows:
+                    break
+        row_start = row_end + 1
+    
+    # 選ばれた行の会話記録（A列）だけを取得
+    target_rows = []
+    if candidates:
+        transcripts = fetch_transcripts(worksheet, [row_index for row_index, *_ in candidates])
+        for row_index, b, c, d in candidates:
+            a = transcripts.get(row_index, "")
+            if not a.strip():
+                continue
+            target_rows.append((row_index, [a, b, c, d]))
+            if first_pending is None:
+                first_pending = row_index
+    
+    # 次回は最初の未処理行から走査する（未処理行がなければ走査済みの次の行から）
+    _save_scan_state(worksheet, first_pending or scanned_to + 1, full_scan_at)
+    set_span_attributes(start_row=start_row, scanned_to=scanned_to, target_rows=len(target_rows))
+    return header_row, target_rows
+
+def serialize_result_row(results):
+    """品質チェック結果（JSON文字列または辞書）を D〜AH列の値の並びに変換（JSONとして読めない場合はNone）"""
+    if isinstance(results, str):
+        try:
+            results = json.loads(results)
+        except ValueError:
+            return None
+    if not isinstance(results, dict):
+        return None
+    
+    values = [""] * (RESULT_LAST_COLUMN - RESULT_FIRST_COLUMN + 1)
+    for header_text, col_index in RESULT_HEADER_MAP.items():
+        value = results.get(header_text, "")
+        # リスト型の場合は文字列に変換
+        if isinstance(value, list):
+            value = ", ".join(str(item) for item in value)
+        values[col_index - RESULT_FIRST_COLUMN] = str(value)
+    return values
+
+def build_result_ranges(value_rows, text_rows=None):
+    """batch_update 用の範囲一覧を作成
+
+    value_rows は {行番号: D〜AH列の値}。行番号が連続する行は1つの範囲にまとめる。
+    text_rows は {行番号: テキスト} で、JSONとして読めなかった結果を報告まとめ列（E列）にだけ書き込む。
+    """
+    first_column = rowcol_to_a1(1, RESULT_FIRST_COLUMN).rstrip("1")
+    last_column = rowcol_to_a1(1, RESULT_LAST_COLUMN).rstrip("1")
+    ranges = []
+    group_start = None
+    group_values = []
+    for row_index in sorted(value_rows):
+        if group_values and row_index != group_start + len(group_values):
+            ranges.append({
+                "range": f"{first_column}{group_start}:{last_column}{group_start + len(group_values) - 1}",
+                "values": group_values
+            })
+            group_values = []
+        if not group_values:
+            group_start = row_index
+        group_values.append(value_rows[row_index])
+    if group_values:
+        ranges.append({
+            "range": f"{first_column}{group_start}:{last_column}{group_start + len(group_values) - 1}",
+            "values": group_values
+        })
+    
+    report_column = rowcol_to_a1(1, RESULT_HEADER_MAP["報告まとめ"]).rstrip("1")
+    for row_index, text in sorted((text_rows or {}).items()):
+        ranges.append({"range": f"{report_column}{row_index}", "values": [[text]]})
+    return ranges
+
+def write_result_rows(worksheet, value_rows, text_rows=None):
+    """品質チェック結果を1回の batch_update で書き込む（画面表示は行わない）"""
+    ranges = build_result_ranges(value_rows, text_rows)
+    if ranges:
+        governed_call("write", worksheet.batch_update, ranges, value_input_option="RAW")
+    return len(ranges)
+
+@traced()
+def write_quality_check_results(gc, results):
+    """品質チェック結果 [(行番号, 結果), ...] を書き込む（画面表示は行わず、失敗時は例外を送出）"""
+    value_rows = {}
+    text_rows = {}
+    for row_index, result in results:
+        values = serialize_result_row(result)
+        if values is not None:
+            value_rows[row_index] = values
+        elif result:
+            # JSONとして読めない結果は報告まとめ列にテキストとして保存
+            text_rows[row_index] = str(result)
+    set_span_attributes(rows=len(value_rows) + len(text_rows))
+    try:
+        write_result_rows(get_worksheet(gc), value_rows, text_rows)
+    except Exception:
+        invalidate_worksheet()
+        raise
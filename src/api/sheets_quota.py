@@ -0,0 +1,135 @@
+"""
+Google Sheets APIの利用枠（1分あたりの読み取り・書き込み回数）を管理するモジュール
+
+スプレッドシートへのリクエストはすべて governed_call を通し、プロセス内の全セッション・全スレッドで
+同じバケットを共有する。枠が足りないときは優先度の高いリクエスト（画面操作）から順に送り、
+429（利用枠超過）が返った場合は全体の送信を一時停止したうえで再試行する。
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+import gspread
+from src.api.rate_limiter import TokenBucket, backoff_delay, parse_retry_after
+from src.utils.tracing import set_span_attributes
+
+# 1分あたりの利用枠（Sheets APIの既定はユーザーごとに読み取り・書き込みとも60回）
+READ_REQUESTS_PER_MINUTE = int(os.getenv("SHEETS_READ_REQUESTS_PER_MINUTE", "60"))
+WRITE_REQUESTS_PER_MINUTE = int(os.getenv("SHEETS_WRITE_REQUESTS_PER_MINUTE", "60"))
+# 429・一時的なエラー時の最大再試行回数
+MAX_RETRIES = int(os.getenv("SHEETS_MAX_RETRIES", "5"))
+# 再試行するHTTPステータス（利用枠超過とサーバー側の一時的なエラー）
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+# 同じリクエストを再送すると結果が変わる操作（追記など）でも再試行できるステータス
+# （429は処理前に拒否されるが、5xxはサーバー側で処理済みの場合がある）
+NON_IDEMPOTENT_RETRYABLE_STATUS_CODES = {429}
+
+# 優先度（値が小さいほど先に送る）
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+
+# 実行中の処理の優先度（指定がなければ画面操作として扱う）
+_current_priority = ContextVar("sheets_priority", default=PRIORITY_INTERACTIVE)
+
+
+@contextmanager
+def sheets_priority(priority):
+    """このブロック内のスプレッドシートへのリクエストを priority の優先度で送る"""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+class SheetsQuotaGovernor:
+    """読み取り・書き込みの2つのバケットと優先度付きの待ち行列で送信ペースを制御する（スレッドセーフ）"""
+
+    def __init__(self, read_per_minute=READ_REQUESTS_PER_MINUTE, write_per_minute=WRITE_REQUESTS_PER_MINUTE):
+        self.buckets = {
+            "read": TokenBucket(read_per_minute, read_per_minute / 60),
+            "write": TokenBucket(write_per_minute, write_per_minute / 60),
+        }
+        self._waiting = {kind: {} for kind in self.buckets}
+        self._blocked_until = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self, kind, priority=None):
+        """送信可能になるまで待機（より優先度の高いリクエストが待っている間は順番を譲る）"""
+        priority = _current_priority.get() if priority is None else priority
+        bucket = self.buckets[kind]
+        waiting = self._waiting[kind]
+        waited_since = time.monotonic()
+        with self._condition:
+            waiting[priority] = waiting.get(priority, 0) + 1
+            try:
+                while True:
+                    wait = self._blocked_until - time.monotonic()
+                    if wait <= 0:
+                        if any(count and other < priority for other, count in waiting.items()):
+                            wait = 1.0
+                        else:
+                            wait = bucket.try_acquire(1)
+                            if wait <= 0:
+                                break
+                    self._condition.wait(min(wait, 1.0))
+            finally:
+                waiting[priority] -= 1
+                self._condition.notify_all()
+        return time.monotonic() - waited_since
+
+    def pause(self, seconds):
+        """利用枠超過時に、全スレッドの送信を一時停止する"""
+        with self._condition:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+            # 停止明けに溜まった分を一度に送らないよう、バケットも空にする
+            for bucket in self.buckets.values():
+                bucket.sync(remaining=0)
+
+    def call(self, kind, fn, *args, idempotent=True, **kwargs):
+        """利用枠に従って fn を実行し、429・一時的なエラーは間隔を空けて再試行する
+
+        idempotent=False の操作（append_rows など）は、再送で重複しないよう429の場合のみ再試行する。
+        """
+        retryable = RETRYABLE_STATUS_CODES if idempotent else NON_IDEMPOTENT_RETRYABLE_STATUS_CODES
+        attempt = 0
+        while True:
+            waited = self.acquire(kind)
+            try:
+                result = fn(*args, **kwargs)
+                set_span_attributes(sheets_quota_wait_seconds=waited, sheets_retries=attempt)
+                return result
+            except gspread.exceptions.APIError as e:
+                response = getattr(e, "response", None)
+                status_code = getattr(response, "status_code", None)
+                attempt += 1
+                if status_code not in retryable or attempt > MAX_RETRIES:
+                    raise
+                delay = parse_retry_after(getattr(response, "headers", None)) or backoff_delay(attempt)
+                if status_code == 429:
+                    self.pause(delay)
+                else:
+                    time.sleep(delay)
+
+
+_governor = None
+_governor_lock = threading.Lock()
+
+
+def get_sheets_governor():
+    """プロセス全体で共有する利用枠の管理オブジェクトを取得"""
+    global _governor
+    with _governor_lock:
+        if _governor is None:
+            _governor = SheetsQuotaGovernor()
+        return _governor
+
+
+def governed_call(kind, fn, *args, idempotent=True, **kwargs):
+    """スプレッドシートへのリクエスト fn を利用枠に従って実行（kind は "read" または "write"）
+
+    同じリクエストを再送すると結果が変わる操作には idempotent=False を指定する。
+    """
+    return get_sheets_governor().call(kind, fn, *args, idempotent=idempotent, **kwargs)
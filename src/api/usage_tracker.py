@@ -0,0 +1,156 @@
+"""
+API呼び出しごとのトークン数・コスト・所要時間を記録し、ノード別・行別に集計するモジュール
+
+集計は実行（usage_run）ごとに分けて保持するため、複数のセッションが同時に実行しても互いの
+集計を上書きしない。記録は集計とあわせてJSONL形式のファイルにも追記し、後から分析できるようにする。
+"""
+
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from src.api.cache import CACHE_DIR
+from src.prompts.prompt_builder import get_cached_tokens
+from src.utils.tracing import set_span_attributes
+
+USAGE_LOG_PATH = os.getenv("USAGE_LOG_PATH", os.path.join(CACHE_DIR, "usage_log.jsonl"))
+
+# モデルごとの料金（USD / 100万トークン）: (入力, キャッシュ適用済み入力, 出力)
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+}
+
+# 処理中の実行と行（ワーカースレッドには run_parallel がコンテキストごと引き継ぐ）
+_current_run = ContextVar("usage_run", default=None)
+_current_row = ContextVar("usage_row", default=None)
+_run_ids = itertools.count(1)
+
+logger = logging.getLogger(__name__)
+
+_stats_lock = threading.Lock()
+_log_lock = threading.Lock()
+# {実行ID: {"nodes": {ノード名: 集計}, "rows": {行ID: 集計}}}
+_run_stats = {}
+
+
+def _empty_stats():
+    return {
+        "calls": 0, "cache_hits": 0, "failures": 0, "retries": 0,
+        "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0,
+        "cost_usd": 0.0, "latency_seconds": 0.0
+    }
+
+
+@contextmanager
+def usage_run():
+    """このブロック内で行われたAPI呼び出しを1つの実行として集計する（ブロックを抜けると集計は破棄）"""
+    run_id = next(_run_ids)
+    with _stats_lock:
+        _run_stats[run_id] = {"nodes": {}, "rows": {}}
+    token = _current_run.set(run_id)
+    try:
+        yield run_id
+    finally:
+        _current_run.reset(token)
+        with _stats_lock:
+            _run_stats.pop(run_id, None)
+
+
+@contextmanager
+def usage_row(row_id):
+    """このブロック内で行われたAPI呼び出しを row_id の行に集計する"""
+    token = _current_row.set(row_id)
+    try:
+        yield
+    finally:
+        _current_row.reset(token)
+
+
+def estimate_cost(model, prompt_tokens, completion_tokens, cached_tokens=0):
+    """トークン数から料金（USD）を概算（料金表にないモデルは0）"""
+    prices = MODEL_PRICES.get(model)
+    if prices is None:
+        return 0.0
+    input_price, cached_price, output_price = prices
+    return (
+        (prompt_tokens - cached_tokens) * input_price
+        + cached_tokens * cached_price
+        + completion_tokens * output_price
+    ) / 1_000_000
+
+
+def record_call(node, model, usage=None, latency_seconds=0.0, retries=0, cache_hit=False, success=True):
+    """1回分のAPI呼び出しを記録"""
+    def _usage_value(name):
+        value = getattr(usage, name, None)
+        if value is None and isinstance(usage, dict):
+            value = usage.get(name)
+        return value or 0
+
+    prompt_tokens = _usage_value("prompt_tokens")
+    completion_tokens = _usage_value("completion_tokens")
+    cached_tokens = get_cached_tokens(usage)
+    record = {
+        "timestamp": time.time(),
+        "run": _current_run.get(),
+        "row": _current_row.get(),
+        "node": node or "chat",
+        "model": model,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "cached_tokens": cached_tokens,
+        "cost_usd": estimate_cost(model, prompt_tokens, completion_tokens, cached_tokens),
+        "latency_seconds": latency_seconds,
+        "retries": retries,
+        "cache_hit": cache_hit,
+        "success": success
+    }
+
+    with _stats_lock:
+        # 実行の外（文字起こしなど）の呼び出しはログにのみ記録する
+        run_stats = _run_stats.get(record["run"])
+        targets = []
+        if run_stats is not None:
+            targets.append(run_stats["nodes"].setdefault(record["node"], _empty_stats()))
+            if record["row"] is not None:
+                targets.append(run_stats["rows"].setdefault(record["row"], _empty_stats()))
+        for stats in targets:
+            stats["calls"] += 1
+            stats["cache_hits"] += cache_hit
+            stats["failures"] += not success
+            for key in ("retries", "prompt_tokens", "completion_tokens", "cached_tokens", "cost_usd", "latency_seconds"):
+                stats[key] += record[key]
+    _append_log(record)
+    # 実行中のスパン（API呼び出し）にも同じ内容を属性として残す
+    set_span_attributes(**{key: value for key, value in record.items() if key not in ("timestamp", "run", "row")})
+    return record
+
+
+def _append_log(record):
+    try:
+        with _log_lock:
+            os.makedirs(os.path.dirname(USAGE_LOG_PATH), exist_ok=True)
+            with open(USAGE_LOG_PATH, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    except OSError as e:
+        # 記録の失敗で本処理を止めない
+        logger.warning("使用量ログの書き込みに失敗しました: %s", e)
+
+
+def get_usage_summary(run_id=None):
+    """実行中（または run_id）の実行のノード別・行別・全体の集計を取得"""
+    run_id = run_id if run_id is not None else _current_run.get()
+    with _stats_lock:
+        run_stats = _run_stats.get(run_id) or {"nodes": {}, "rows": {}}
+        nodes = {name: dict(stats) for name, stats in run_stats["nodes"].items()}
+        rows = {row: dict(stats) for row, stats in run_stats["rows"].items()}
+    total = _empty_stats()
+    for stats in nodes.values():
+        for key in total:
+            total[key] += stats[key]
+    return {"nodes": nodes, "rows": rows, "total": total}
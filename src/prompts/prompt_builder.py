@@ -0,0 +1,33 @@
+"""
+システムプロンプトの組み立てとプロンプトキャッシュの適用トークン数の取得を行うモジュール
+
+キャッシュの適用状況は usage_tracker がノード別に集計する。
+"""
+
+from src.prompts.system_prompts import SYSTEM_PROMPTS
+
+# 可変部分の見出し（プロンプト本文からは見出し名で参照する）
+PROMPT_VARIABLE_HEADINGS = {
+    'checker': '#担当者名一覧',
+}
+
+def build_system_prompt(name, **variables):
+    """静的なルール本文を先頭に、実行ごとに変わる値を末尾に配置したシステムプロンプトを作成"""
+    sections = [SYSTEM_PROMPTS[name]]
+    for key, value in variables.items():
+        if value:
+            sections.append(f"{PROMPT_VARIABLE_HEADINGS[key]}\n{value}")
+    return "\n\n".join(sections)
+
+
+def get_cached_tokens(usage):
+    """response.usage からプロンプトキャッシュが適用されたトークン数を取得"""
+    if usage is None:
+        return 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    if details is None and isinstance(usage, dict):
+        details = usage.get("prompt_tokens_details")
+    if isinstance(details, dict):
+        return details.get("cached_tokens") or 0
+    return getattr(details, "cached_tokens", 0) or 0
+
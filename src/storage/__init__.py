@@ -0,0 +1,3 @@
+"""
+会話記録と品質チェック結果の保存先（バックエンド）モジュール
+"""
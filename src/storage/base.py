@@ -0,0 +1,45 @@
+"""
+会話記録と品質チェック結果の保存先の共通インターフェース
+"""
+
+from abc import ABC, abstractmethod
+
+# 未処理行の一覧で返すヘッダー（スプレッドシートのA〜D列に対応）
+PENDING_HEADER_ROW = ["会話記録", "ファイル名", "処理日時", "テレアポ担当者名"]
+
+
+class ResultStore(ABC):
+    """保存先の共通インターフェース
+
+    行IDは保存先ごとの識別子（スプレッドシートでは行番号、SQLiteでは連番）で、
+    list_pending で取得したIDを write_results にそのまま渡す。
+    name は行IDの体系を区別する保存先の名前（書き込み待ちのジャーナルで使用）。
+    複製先を持つ保存先は、複製に失敗した最後のエラーを last_mirror_error に記録する。
+    """
+
+    name = None
+    last_mirror_error = None
+
+    @abstractmethod
+    def append_transcripts(self, records):
+        """文字起こし結果 [(テキスト, ファイル名), ...] を追加し、行IDの一覧を返す"""
+
+    @abstractmethod
+    def list_pending(self, max_rows=50):
+        """品質チェック前の行を (ヘッダー行, [(行ID, [会話記録, ファイル名, 処理日時, 担当者名]), ...]) で返す"""
+
+    @abstractmethod
+    def write_results(self, results):
+        """品質チェック結果 [(行ID, 結果JSON), ...] を書き込む（失敗時は例外を送出）"""
+
+    @abstractmethod
+    def query_history(self, filename=None, since=None, limit=100):
+        """品質チェック済みの結果を新しい順に返す
+
+        filename はファイル名の部分一致、since は処理日時（"YYYY-MM-DD HH:MM:SS"）の下限。
+        各要素は {"row_id", "filename", "processed_at", "result"} の辞書。
+        """
+
+    def unmirrored_count(self):
+        """複製先に送れていない件数（複製先を持たない保存先は常に0）"""
+        return 0
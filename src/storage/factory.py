@@ -0,0 +1,40 @@
+"""
+設定に応じた保存先（バックエンド）を作成するモジュール
+"""
+
+import os
+import threading
+from src.api.cache import CACHE_DIR
+from src.api.sheets_quota import PRIORITY_BATCH
+from src.storage.sheets_store import SheetsResultStore
+from src.storage.sqlite_store import SQLiteResultStore
+
+# 保存先: "sheets"（スプレッドシートのみ）または "sqlite"（ローカルDBを主とし、スプレッドシートに複製）
+RESULT_STORE_BACKEND = os.getenv("RESULT_STORE", "sheets")
+RESULT_STORE_PATH = os.getenv("RESULT_STORE_PATH", os.path.join(CACHE_DIR, "results.sqlite3"))
+# sqlite の場合にスプレッドシートへ複製するか
+RESULT_STORE_MIRROR = os.getenv("RESULT_STORE_MIRROR", "1") != "0"
+
+_stores = {}
+_store_lock = threading.Lock()
+
+
+def get_result_store(gc, backend=None):
+    """プロセス全体で共有する保存先を取得"""
+    backend = backend or RESULT_STORE_BACKEND
+    with _store_lock:
+        cached = _stores.get(backend)
+        if cached is not None and cached[0] is gc:
+            return cached[1]
+        if backend == "sqlite":
+            # 複製はバックグラウンドで行うため、画面操作のリクエストを優先させる
+            mirror = SheetsResultStore(gc, priority=PRIORITY_BATCH) if RESULT_STORE_MIRROR and gc is not None else None
+            store = SQLiteResultStore(RESULT_STORE_PATH, mirror=mirror)
+            # 前回までに複製できなかった分を再送
+            store.sync_mirror()
+        elif backend == "sheets":
+            store = SheetsResultStore(gc)
+        else:
+            raise ValueError(f"不明な保存先です: {backend}")
+        _stores[backend] = (gc, store)
+        return store
@@ -0,0 +1,53 @@
+"""
+Google Sheetsを保存先とするバックエンド
+"""
+
+from src.api.sheets_client import (
+    RESULT_HEADER_MAP, get_worksheet, scan_pending_rows, append_transcript_rows, write_quality_check_results
+)
+from src.api.sheets_quota import governed_call, sheets_priority, PRIORITY_INTERACTIVE
+from src.storage.base import ResultStore
+
+
+class SheetsResultStore(ResultStore):
+    """「テレアポチェックシート」の「Difyテスト」シートを保存先とする（行IDはシートの行番号）
+
+    priority はこの保存先からのリクエストの優先度（バックグラウンドの複製などでは PRIORITY_BATCH を渡す）。
+    """
+
+    name = "sheets"
+
+    def __init__(self, gc, priority=PRIORITY_INTERACTIVE):
+        self.gc = gc
+        self.priority = priority
+
+    def append_transcripts(self, records):
+        with sheets_priority(self.priority):
+            return append_transcript_rows(self.gc, records)
+
+    def list_pending(self, max_rows=50):
+        with sheets_priority(self.priority):
+            return scan_pending_rows(get_worksheet(self.gc), max_rows)
+
+    def write_results(self, results):
+        with sheets_priority(self.priority):
+            write_quality_check_results(self.gc, results)
+
+    def query_history(self, filename=None, since=None, limit=100):
+        # シートには索引がないため全行を読み込んで絞り込む
+        with sheets_priority(self.priority):
+            all_values = governed_call("read", get_worksheet(self.gc).get_all_values)
+        history = []
+        for row_index, row in reversed(list(enumerate(all_values[1:], start=2))):
+            row = row + [""] * (max(RESULT_HEADER_MAP.values()) - len(row))
+            if not row[3].strip():
+                continue
+            if filename and filename not in row[1]:
+                continue
+            if since and row[2] < since:
+                continue
+            result = {header: row[col_index - 1] for header, col_index in RESULT_HEADER_MAP.items()}
+            history.append({"row_id": row_index, "filename": row[1], "processed_at": row[2], "result": result})
+            if len(history) >= limit:
+                break
+        return history
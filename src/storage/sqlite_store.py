@@ -0,0 +1,199 @@
+"""
+ローカルのSQLiteを保存先とするバックエンド（スプレッドシートへの非同期ミラー付き）
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from src.api.rate_limiter import backoff_delay
+from src.storage.base import ResultStore, PENDING_HEADER_ROW
+
+# 1回の複製で送る最大件数
+_MIRROR_CHUNK_ROWS = 200
+# 複製に失敗した場合の再送間隔の上限（秒）
+MAX_MIRROR_RETRY_SECONDS = 300
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteResultStore(ResultStore):
+    """SQLiteを主な保存先とし、必要に応じて別の保存先（スプレッドシート）に非同期で複製する
+
+    索引のあるローカルDBで未処理行の検索や履歴の照会を行うため、シート全体を読み込む必要がない。
+    mirror には SheetsResultStore などを渡す。複製は1つのスレッドで順に行い、
+    失敗した分は間隔を空けて sync_mirror で自動的に再送する（文字起こし→結果の順序は保たれる）。
+    last_mirror_error は未複製の行がなくなるまで残す。
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path, mirror=None):
+        self.path = path
+        self.mirror = mirror
+        self.last_mirror_error = None
+        self._mirror_failures = 0
+        self._retry_timer = None
+        self._lock = threading.Lock()
+        self._mirror_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="result-store-mirror") if mirror else None
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS calls ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, transcript TEXT NOT NULL, filename TEXT NOT NULL, "
+            "processed_at TEXT NOT NULL, result_json TEXT, checked_at TEXT, "
+            "sheet_row INTEGER, result_mirrored INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS calls_pending ON calls (id) WHERE result_json IS NULL")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS calls_processed_at ON calls (processed_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS calls_filename ON calls (filename)")
+        self._conn.commit()
+
+    def append_transcripts(self, records):
+        processed_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._lock:
+            row_ids = []
+            for transcript_text, filename in records:
+                cursor = self._conn.execute(
+                    "INSERT INTO calls (transcript, filename, processed_at) VALUES (?, ?, ?)",
+                    (transcript_text, filename, processed_at)
+                )
+                row_ids.append(cursor.lastrowid)
+            self._conn.commit()
+        self._submit_mirror(self._mirror_transcripts, row_ids)
+        return row_ids
+
+    def list_pending(self, max_rows=50):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, transcript, filename, processed_at FROM calls WHERE result_json IS NULL ORDER BY id LIMIT ?",
+                (max_rows,)
+            ).fetchall()
+        return PENDING_HEADER_ROW, [(row_id, [transcript, filename, processed_at, ""]) for row_id, transcript, filename, processed_at in rows]
+
+    def write_results(self, results):
+        checked_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE calls SET result_json = ?, checked_at = ?, result_mirrored = 0 WHERE id = ?",
+                [(result_json, checked_at, row_id) for row_id, result_json in results]
+            )
+            self._conn.commit()
+        self._submit_mirror(self._mirror_results, [row_id for row_id, _ in results])
+
+    def query_history(self, filename=None, since=None, limit=100):
+        conditions = ["result_json IS NOT NULL"]
+        params = []
+        if filename:
+            conditions.append("filename LIKE ?")
+            params.append(f"%{filename}%")
+        if since:
+            conditions.append("processed_at >= ?")
+            params.append(since)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, filename, processed_at, result_json FROM calls WHERE {' AND '.join(conditions)} "
+                "ORDER BY processed_at DESC, id DESC LIMIT ?",
+                params + [limit]
+            ).fetchall()
+        history = []
+        for row_id, row_filename, processed_at, result_json in rows:
+            try:
+                result = json.loads(result_json)
+            except ValueError:
+                result = {"報告まとめ": result_json}
+            history.append({"row_id": row_id, "filename": row_filename, "processed_at": processed_at, "result": result})
+        return history
+
+    def sync_mirror(self):
+        """複製できていない文字起こしと結果をまとめて複製先に送る（起動時や失敗後の再送用）"""
+        with self._lock:
+            transcript_ids = [row_id for (row_id,) in self._conn.execute(
+                "SELECT id FROM calls WHERE sheet_row IS NULL ORDER BY id"
+            )]
+            result_ids = [row_id for (row_id,) in self._conn.execute(
+                "SELECT id FROM calls WHERE result_json IS NOT NULL AND result_mirrored = 0 ORDER BY id"
+            )]
+        self._submit_mirror(self._mirror_transcripts, transcript_ids)
+        self._submit_mirror(self._mirror_results, result_ids)
+
+    def _submit_mirror(self, fn, row_ids):
+        if self._mirror_executor is None:
+            return
+        for i in range(0, len(row_ids), _MIRROR_CHUNK_ROWS):
+            self._mirror_executor.submit(self._run_mirror, fn, row_ids[i:i + _MIRROR_CHUNK_ROWS])
+
+    def unmirrored_count(self):
+        """複製先に送れていない文字起こしと結果の件数"""
+        if self.mirror is None:
+            return 0
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM calls WHERE sheet_row IS NULL "
+                "OR (result_json IS NOT NULL AND result_mirrored = 0 AND sheet_row > 0)"
+            ).fetchone()[0]
+
+    def _run_mirror(self, fn, row_ids):
+        try:
+            fn(row_ids)
+        except Exception as e:
+            # ローカルには保存済みのため、間隔を空けて未複製の分をまとめて再送する
+            self.last_mirror_error = str(e)
+            self._mirror_failures += 1
+            logger.warning("スプレッドシートへの複製に失敗しました: %s", e)
+            self._schedule_retry()
+            return
+        if self.last_mirror_error is not None and not self.unmirrored_count():
+            self.last_mirror_error = None
+            self._mirror_failures = 0
+
+    def _schedule_retry(self):
+        with self._lock:
+            if self._retry_timer is not None and self._retry_timer.is_alive():
+                return
+            self._retry_timer = threading.Timer(
+                backoff_delay(self._mirror_failures, cap=MAX_MIRROR_RETRY_SECONDS), self.sync_mirror
+            )
+            self._retry_timer.daemon = True
+            self._retry_timer.start()
+
+    def _mirror_transcripts(self, row_ids):
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, transcript, filename FROM calls WHERE sheet_row IS NULL AND id IN ({','.join('?' * len(row_ids))}) ORDER BY id",
+                row_ids
+            ).fetchall()
+        if not rows:
+            return
+        sheet_rows = self.mirror.append_transcripts([(transcript, filename) for _, transcript, filename in rows])
+        # 追記APIの応答から得た行番号を対応付ける
+        # （件数が合わない場合は行番号0として記録し、再送による重複と誤った行への結果の書き込みを防ぐ）
+        if len(sheet_rows) != len(rows):
+            sheet_rows = [0] * len(rows)
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE calls SET sheet_row = ? WHERE id = ?",
+                [(sheet_row, row_id) for sheet_row, (row_id, _, _) in zip(sheet_rows, rows)]
+            )
+            self._conn.commit()
+
+    def _mirror_results(self, row_ids):
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, sheet_row, result_json FROM calls WHERE result_json IS NOT NULL AND result_mirrored = 0 "
+                f"AND sheet_row > 0 AND id IN ({','.join('?' * len(row_ids))})",
+                row_ids
+            ).fetchall()
+        if not rows:
+            return
+        self.mirror.write_results([(sheet_row, result_json) for _, sheet_row, result_json in rows])
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE calls SET result_mirrored = 1 WHERE id = ?", [(row_id,) for row_id, _, _ in rows]
+            )
+            self._conn.commit()
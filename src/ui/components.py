@@ -34,7 +34,7 @@ def render_upload_section():
     st.markdown("### 📁 音声ファイルアップロード")
     
     uploaded_files = st.file_uploader(
-        "mp3ファイルを選択してください（最大25MB）",
+        "mp3ファイルを選択してください（25MBを超える長時間録音は自動で分割して文字起こしします）",
         type=['mp3'],
         help="テレアポの録音データをアップロードしてください",
         accept_multiple_files=True
@@ -14,9 +14,15 @@ from src.ui.components import (
     show_error_message,
     show_info_message
 )
-from src.api.openai_client import init_openai_client, transcribe_audio
-from src.api.sheets_client import init_google_sheets, write_to_sheets
-from src.utils.batch_processor import run_quality_check_batch
+from src.api.openai_client import init_openai_client, transcribe_audio, check_openai_connection
+from src.api.sheets_client import init_google_sheets, check_sheets_connection, APPEND_BATCH_ROWS
+from src.storage.factory import get_result_store
+from src.api.http_transport import MAX_CONCURRENT_ROWS
+from src.utils.batch_processor import (
+    run_quality_check_batch, run_quality_check_offline, start_result_journal, render_failed_results,
+    render_mirror_status
+)
+from src.utils.quality_check import PIPELINE_STANDARD, PIPELINE_STRUCTURED
 
 
 def main():
@@ -33,6 +39,12 @@ def main():
         show_error_message("API接続の初期化に失敗しました。設定を確認してください。")
         return
     
+    # 前回の実行で書き込めなかった品質チェック結果があれば書き込みを再開
+    start_result_journal(clients['sheets'])
+    
+    # 接続確認（ボタン押下時のみ実行）
+    _render_connection_status(clients)
+    
     # タブの設定
     tab1, tab2 = st.tabs(["📝 文字起こし", "🔍 品質チェック"])
     
@@ -61,11 +73,33 @@ def _initialize_api_clients():
             return {'openai': None, 'sheets': None}
 
 
+def _render_connection_status(clients):
+    """API接続状態の確認セクション"""
+    with st.expander("🔌 API接続状態"):
+        if st.button("接続を確認", key="check_connections"):
+            with st.spinner("接続を確認中..."):
+                for ok, message in (
+                    check_openai_connection(clients['openai']),
+                    check_sheets_connection(clients['sheets'])
+                ):
+                    if ok:
+                        show_success_message(message)
+                    else:
+                        show_error_message(message)
+
+
 def _handle_transcription_tab(clients):
     """文字起こしタブの処理"""
     # 音声アップロードセクション
     uploaded_files = render_upload_section()
     
+    # 長時間録音の分割文字起こし（25MB超のファイルは常に分割）
+    split_long_audio = st.checkbox(
+        "長時間録音を分割して並列で文字起こしする",
+        value=False,
+        help="録音を数分ごとの区間に分割して同時に文字起こしし、結果を1つにまとめます"
+    )
+    
     # 処理ボタン
     process_button = st.button("🎤 文字起こし開始", type="primary", use_container_width=True)
     
@@ -79,20 +113,40 @@ def _handle_transcription_tab(clients):
         # プログレスバーの初期化
         overall_progress = st.progress(0.0)
         
+        # 文字起こし結果はまとめて保存先（Google Sheets または ローカルDB）に追記する
+        pending_records = []
+        
+        def _flush_pending_records():
+            nonlocal processed_files, error_files
+            if not pending_records:
+                return
+            filenames = [filename for _, filename in pending_records]
+            try:
+                get_result_store(clients['sheets']).append_transcripts(pending_records)
+                show_success_message(f"{'、'.join(filenames)} の文字起こしが完了し、保存されました")
+                processed_files += len(filenames)
+            except Exception as e:
+                show_error_message(f"文字起こし結果の保存に失敗しました: {str(e)}")
+                error_files += len(filenames)
+            pending_records.clear()
+        
         for i, uploaded_file in enumerate(uploaded_files):
             with st.spinner(f"🎤 {uploaded_file.name} を文字起こし中... ({i+1}/{total_files})"):
                 try:
                     # 文字起こし処理
-                    transcript_text = transcribe_audio(uploaded_file, clients['openai'])
+                    transcript_text = transcribe_audio(
+                        uploaded_file, clients['openai'],
+                        chunked=True if split_long_audio else None
+                    )
                     
                     if transcript_text:
                         # 結果表示（個別ファイルごとには表示しないか、限定的にする）
                         # render_result_section(transcript_text) # 個別表示はコメントアウト
                         
-                        # Google Sheetsに保存
-                        write_to_sheets(clients['sheets'], transcript_text, uploaded_file.name)
-                        show_success_message(f"{uploaded_file.name} の文字起こしが完了し、Google Sheetsに保存されました")
-                        processed_files += 1
+                        # Google Sheetsへの保存はまとめて行う（途中で止まっても保存済みの分が残るよう一定件数ごとに書き込む）
+                        pending_records.append((transcript_text, uploaded_file.name))
+                        if len(pending_records) >= APPEND_BATCH_ROWS:
+                            _flush_pending_records()
                     else:
                         show_error_message(f"{uploaded_file.name} の文字起こしに失敗しました")
                         error_files += 1
@@ -103,6 +157,9 @@ def _handle_transcription_tab(clients):
             
             # 全体進捗の更新
             overall_progress.progress((i + 1) / total_files)
+        
+        # 残りの文字起こし結果を保存
+        _flush_pending_records()
 
         # 全体処理完了メッセージ
         if processed_files > 0:
@@ -124,13 +181,39 @@ def _handle_quality_check_tab(clients):
     # バッチサイズは固定値5で設定
     batch_size = 5
     
+    # 前回までに書き込めなかった結果があれば再送できるようにする
+    render_failed_results(start_result_journal(clients['sheets'], batch_size), key="requeue_failed_results_tab")
+    render_mirror_status(clients['sheets'])
+    
     # 処理設定
-    col1, col2 = st.columns(2)
+    col1, col2, col3 = st.columns(3)
     with col1:
         max_rows = st.number_input("最大処理行数", min_value=1, max_value=1000, value=50)
     with col2:
+        max_workers = st.number_input(
+            "同時処理数", min_value=1, max_value=MAX_CONCURRENT_ROWS, value=min(4, MAX_CONCURRENT_ROWS),
+            help="同時に品質チェックを行う会話記録の件数"
+        )
+    with col3:
         st.metric("選択された担当者", len(selected_checkers))
     
+    # 実行モード（バッチ送信は結果が出るまで最大24時間かかるが、低コストで大量に処理できる）
+    run_mode = st.radio(
+        "実行モード",
+        ["通常（即時処理）", "バッチ送信（夜間処理・低コスト）"],
+        horizontal=True,
+        help="バッチ送信では全行分のリクエストを段階ごとにまとめて送信し、完了後に結果を書き込みます"
+    )
+    
+    # チェック方式（一括判定は1行あたりのAPI呼び出しを8回から3回に削減）
+    check_method = st.radio(
+        "チェック方式",
+        ["項目別チェック（Dify互換）", "一括判定（構造化出力）"],
+        horizontal=True,
+        help="一括判定では全ルールを1回の呼び出しで判定し、結果の連結・JSON変換を省略します（通常モードのみ）"
+    )
+    pipeline = PIPELINE_STRUCTURED if check_method.startswith("一括判定") else PIPELINE_STANDARD
+    
     # 実行ボタン
     run_check_button = st.button("🔍 品質チェック実行", type="primary", use_container_width=True)
     
@@ -148,15 +231,28 @@ def _handle_quality_check_tab(clients):
             checker_str = ", ".join(selected_checkers)
             
             with st.spinner("🔍 品質チェック処理を実行中..."):
-                run_quality_check_batch(
-                    clients['sheets'], 
-                    clients['openai'], 
-                    checker_str, 
-                    progress_bar, 
-                    status_text, 
-                    max_rows=max_rows,
-                    batch_size=batch_size
-                )
+                if run_mode.startswith("バッチ送信"):
+                    run_quality_check_offline(
+                        clients['sheets'],
+                        clients['openai'],
+                        checker_str,
+                        progress_bar,
+                        status_text,
+                        max_rows=max_rows,
+                        batch_size=batch_size
+                    )
+                else:
+                    run_quality_check_batch(
+                        clients['sheets'], 
+                        clients['openai'], 
+                        checker_str, 
+                        progress_bar, 
+                        status_text, 
+                        max_rows=max_rows,
+                        batch_size=batch_size,
+                        max_workers=max_workers,
+                        pipeline=pipeline
+                    )
             
             show_success_message("品質チェックが完了しました")
             
@@ -165,4 +261,41 @@ def _handle_quality_check_tab(clients):
         finally:
             # 進捗表示をクリア
             progress_bar.empty()
-            status_text.empty() 
\ No newline at end of file
+            status_text.empty()
+    
+    _render_check_history(clients)
+
+
+def _render_check_history(clients):
+    """品質チェック済みの結果を保存先から検索して表示"""
+    with st.expander("📜 品質チェック履歴"):
+        col1, col2 = st.columns(2)
+        with col1:
+            filename = st.text_input("ファイル名（部分一致）", key="history_filename")
+        with col2:
+            since = st.date_input("処理日（この日以降）", value=None, key="history_since")
+        
+        if not st.button("履歴を検索", key="history_search"):
+            return
+        try:
+            history = get_result_store(clients['sheets']).query_history(
+                filename=filename or None,
+                since=since.strftime("%Y-%m-%d 00:00:00") if since else None
+            )
+        except Exception as e:
+            show_error_message(f"履歴の取得に失敗しました: {str(e)}")
+            return
+        
+        if not history:
+            show_info_message("該当する履歴がありません")
+            return
+        st.table([
+            {
+                "ファイル名": item["filename"],
+                "処理日時": item["processed_at"],
+                "担当者": item["result"].get("テレアポ担当者名", ""),
+                "報告まとめ": "\n".join(item["result"]["報告まとめ"])
+                if isinstance(item["result"].get("報告まとめ"), list) else item["result"].get("報告まとめ", "")
+            }
+            for item in history
+        ]) 
\ No newline at end of file
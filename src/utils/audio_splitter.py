@@ -0,0 +1,182 @@
+"""
+MP3音声の分割と分割文字起こし結果の結合を行うモジュール
+
+MP3はフレーム単位で独立して再生できるため、デコードせずにフレーム境界で切り出す。
+"""
+
+import io
+from difflib import SequenceMatcher
+
+# ビットレート表（kbps）: (MPEGバージョン, レイヤー) ごと
+_BITRATES = {
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_SAMPLE_RATES = {
+    1: [44100, 48000, 32000],
+    2: [22050, 24000, 16000],
+    2.5: [11025, 12000, 8000],
+}
+
+
+class MemoryViewReader(io.RawIOBase):
+    """memoryviewをコピーせずにファイルオブジェクトとして読み出すためのラッパー
+
+    アップロード用のHTTPクライアントが少しずつ読み出すため、音声全体の複製は作られない。
+    """
+
+    def __init__(self, view):
+        super().__init__()
+        self._view = view
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = min(len(buffer), len(self._view) - self._position)
+        if size <= 0:
+            return 0
+        buffer[:size] = self._view[self._position:self._position + size]
+        self._position += size
+        return size
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = len(self._view) + offset
+        else:
+            raise ValueError(f"invalid whence: {whence}")
+        self._position = max(0, position)
+        return self._position
+
+    def tell(self):
+        return self._position
+
+
+def _parse_frame_header(data, offset):
+    """フレームヘッダーを解析し (フレーム長[byte], 再生時間[秒]) を返す（不正ならNone）"""
+    if offset + 4 > len(data):
+        return None
+    b1, b2 = data[offset + 1], data[offset + 2]
+    if data[offset] != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+
+    version = {0b00: 2.5, 0b10: 2, 0b11: 1}.get((b1 >> 3) & 0x03)
+    layer = {0b01: 3, 0b10: 2, 0b11: 1}.get((b1 >> 1) & 0x03)
+    bitrate_index = (b2 >> 4) & 0x0F
+    sample_rate_index = (b2 >> 2) & 0x03
+    if version is None or layer is None or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    bitrate = _BITRATES[(1 if version == 1 else 2, layer)][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][sample_rate_index]
+    padding = (b2 >> 1) & 0x01
+
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples = 1152 if (layer == 2 or version == 1) else 576
+        length = samples // 8 * bitrate // sample_rate + padding
+    return length, samples / sample_rate
+
+
+def _skip_id3v2(data):
+    """先頭のID3v2タグを読み飛ばした位置を返す"""
+    if len(data) >= 10 and bytes(data[:3]) == b"ID3":
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        footer = 10 if data[5] & 0x10 else 0
+        return 10 + size + footer
+    return 0
+
+
+def scan_mp3_frames(data):
+    """MP3フレームの (開始位置, 再生時間[秒]) の一覧を返す"""
+    frames = []
+    offset = _skip_id3v2(data)
+    while offset < len(data):
+        header = _parse_frame_header(data, offset)
+        if header is None or header[0] <= 0:
+            # 同期が外れた場合は次の同期ワードを探す
+            offset += 1
+            continue
+        length, duration = header
+        if offset + length > len(data):
+            break
+        frames.append((offset, duration))
+        offset += length
+    return frames
+
+
+def split_mp3(data, segment_seconds=600, overlap_seconds=5, max_segment_bytes=24 * 1024 * 1024):
+    """MP3を重なりのある時間区間に分割し、(開始byte, 終了byte) の一覧を返す
+
+    各区間は segment_seconds 秒以内かつ max_segment_bytes 以内に収め、
+    次の区間は前の区間の終わり overlap_seconds 秒前から始める。
+    """
+    frames = scan_mp3_frames(data)
+    if not frames:
+        return []
+
+    # 各フレームの開始時刻と終了位置
+    starts, ends, times = [], [], []
+    elapsed = 0.0
+    for i, (offset, duration) in enumerate(frames):
+        starts.append(offset)
+        ends.append(frames[i + 1][0] if i + 1 < len(frames) else len(data))
+        times.append(elapsed)
+        elapsed += duration
+    times.append(elapsed)
+
+    segments = []
+    first = 0
+    while first < len(frames):
+        last = first
+        while (last + 1 < len(frames)
+               and times[last + 2] - times[first] <= segment_seconds
+               and ends[last + 1] - starts[first] <= max_segment_bytes):
+            last += 1
+        segments.append((starts[first], ends[last]))
+        if last + 1 >= len(frames):
+            break
+
+        # 重なり部分を残して次の区間の開始フレームを決める（必ず前進させる）
+        next_first = last + 1
+        overlap_start = times[last + 1] - overlap_seconds
+        while next_first - 1 > first and times[next_first - 1] >= overlap_start:
+            next_first -= 1
+        first = max(next_first, first + 1)
+    return segments
+
+
+def merge_transcripts(texts, window=200, min_match=8):
+    """分割文字起こしの結果を順に結合し、重なり部分の重複テキストを取り除く"""
+    merged = ""
+    for text in texts:
+        text = (text or "").strip()
+        if not text:
+            continue
+        if not merged:
+            merged = text
+            continue
+
+        tail = merged[-window:]
+        head = text[:window]
+        match = SequenceMatcher(None, tail, head, autojunk=False).find_longest_match(0, len(tail), 0, len(head))
+        if match.size >= min_match:
+            # 一致部分より前を前半から、一致部分以降を後半から採用する
+            merged = merged[:len(merged) - len(tail) + match.a] + text[match.b:]
+        else:
+            merged = merged + text
+    return merged
@@ -2,52 +2,290 @@
 バッチ処理用のワークフロー管理モジュール
 """
 
+import threading
 import streamlit as st
-import time
-from src.utils.quality_check import run_workflow
-from src.api.sheets_client import get_target_rows, update_quality_check_results
+from src.utils.quality_check import (
+    run_workflow, build_node_request, node_concat, finalize_result_json, merge_rule_results, parse_speaker_segments,
+    format_segments, CHECK_NODES, PIPELINE_STANDARD
+)
+from src.api.model_routing import get_node_model
+from src.api.sheets_client import invalidate_worksheet
+from src.api.batch_client import OpenAIBatchBackend, build_batch_line, run_batch
+from src.utils.parallel import run_parallel
+from src.utils.rule_engine import LOCAL_CHECK_NODES, evaluate_rules, format_rule_report
+from src.api.usage_tracker import usage_run, usage_row, get_usage_summary
+from src.utils.tracing import span, traced
+from src.utils.result_journal import get_result_journal
+from src.storage.factory import get_result_store
+from src.api.sheets_quota import sheets_priority, PRIORITY_BATCH
 
 
-def run_quality_check_batch(gc, client, checker_str, progress_bar, status_text, max_rows=50, batch_size=10):
+@traced()
+def run_quality_check_batch(gc, client, checker_str, progress_bar, status_text, max_rows=50, batch_size=10, max_workers=1,
+                            pipeline=PIPELINE_STANDARD):
     """バッチ処理で品質チェックを実行"""
     try:
-        # 処理対象の行を取得
-        header_row, target_rows = get_target_rows(gc, max_rows)
+        # 結果はジャーナル経由で保存先に書き込む
+        journal = start_result_journal(gc, batch_size)
+        
+        # 処理対象の行を取得（結果が書き込み待ちの行は処理済みとして除く）
+        _, target_rows = list_target_rows(gc, max_rows)
+        pending_rows = journal.pending_rows()
+        target_rows = [(row_index, row) for row_index, row in target_rows if row_index not in pending_rows]
         
         if not target_rows:
             st.markdown('<div class="info-box">処理対象のデータがありません</div>', unsafe_allow_html=True)
             return
         
-        # ヘッダーマップを作成
-        header_map = _create_header_map(header_row)
+        # 使用量は実行ごとに集計する（他のセッションの実行とは別に集計される）
+        with usage_run():
+            # 進捗表示の初期化
+            _initialize_progress_display(progress_bar, status_text, len(target_rows))
+            
+            # メトリクス表示
+            metrics_containers = _setup_metrics_display(len(target_rows))
+            
+            # バッチ処理実行
+            _process_batch(
+                target_rows, checker_str, client, journal,
+                progress_bar, status_text, metrics_containers,
+                max_workers=max_workers, pipeline=pipeline
+            )
         
-        # 進捗表示の初期化
-        _initialize_progress_display(progress_bar, status_text, len(target_rows))
+    except Exception as e:
+        invalidate_worksheet()
+        st.error(f"バッチ処理エラー: {str(e)}")
+
+
+def run_quality_check_offline(gc, client, checker_str, progress_bar, status_text, max_rows=50, batch_size=10,
+                              backend=None, poll_interval=60):
+    """Batch APIでまとめて品質チェックを実行（即時性は不要な夜間処理向け・低コスト）
+
+    ワークフローの各段階（置換→話者分離→5項目チェック→JSON変換）ごとに全行分のリクエストを
+    1つのバッチとして送信し、完了を待って次の段階に進む。
+    backend を省略した場合はOpenAI Batch APIを使用する。
+    """
+    try:
+        journal = start_result_journal(gc, batch_size)
         
-        # メトリクス表示
-        metrics_containers = _setup_metrics_display(len(target_rows))
+        # 処理対象の行を取得（結果が書き込み待ちの行は処理済みとして除く）
+        _, target_rows = list_target_rows(gc, max_rows)
+        pending_rows = journal.pending_rows()
+        texts = {
+            row_index: row[0] for row_index, row in target_rows
+            if row and row[0].strip() and row_index not in pending_rows
+        }
         
-        # スプレッドシートを取得
-        spreadsheet = gc.open("テレアポチェックシート")
-        worksheet = spreadsheet.worksheet("Difyテスト")
+        if not texts:
+            st.markdown('<div class="info-box">処理対象のデータがありません</div>', unsafe_allow_html=True)
+            return
         
-        # バッチ処理実行
-        _process_batch(
-            target_rows, checker_str, client, worksheet, header_map,
-            batch_size, progress_bar, status_text, metrics_containers
-        )
+        backend = backend or OpenAIBatchBackend(client)
+        _initialize_progress_display(progress_bar, status_text, len(texts))
+        
+        def _stage(stage_number, label, inputs, node_names):
+            requests = {
+                (row_index, node_name): build_node_request(node_name, inputs[row_index], checker_str)
+                for row_index in inputs for node_name in node_names
+            }
+            return _run_offline_stage(backend, stage_number, label, requests, progress_bar, status_text, poll_interval)
+        
+        # 1. 固有名詞の置換
+        outputs = _stage(1, "固有名詞の置換", texts, ('replace',))
+        text_fixed = {row: outputs.get((row, 'replace')) for row in texts}
+        text_fixed = {row: text for row, text in text_fixed.items() if text and text.strip()}
+        
+        # 2. 話者分離
+        outputs = _stage(2, "話者分離", text_fixed, ('speaker',))
+        segments = {row: parse_speaker_segments(outputs.get((row, 'speaker'))) for row in text_fixed}
+        text_separated = {row: format_segments(segs) for row, segs in segments.items() if segs}
+        rule_results = {row: evaluate_rules(segments[row]) for row in text_separated}
+        
+        # 3. 5項目のチェック（全行をまとめて1つのバッチで送信。ローカル判定で完結するノードは送信しない）
+        llm_nodes = tuple(name for name in CHECK_NODES if name not in LOCAL_CHECK_NODES)
+        outputs = _stage(3, "5項目のチェック", text_separated, llm_nodes)
+        check_results = {}
+        for row in text_separated:
+            checks = {name: (outputs.get((row, name)) or "チェック失敗") for name in llm_nodes}
+            for name, columns in LOCAL_CHECK_NODES.items():
+                checks[name] = format_rule_report(rule_results[row], columns)
+            check_results[row] = checks
+        
+        # 4. 結果の連結とJSON変換
+        concatenated = {row: node_concat(*(checks[name] for name in CHECK_NODES)) for row, checks in check_results.items()}
+        outputs = _stage(4, "JSON形式に変換", concatenated, ('to_json',))
+        results = [
+            (row, merge_rule_results(finalize_result_json(outputs.get((row, 'to_json')), check_results[row]), rule_results[row]))
+            for row in sorted(check_results)
+        ]
+        
+        # ジャーナルに記録し、スプレッドシートへの書き込み完了を待つ
+        for row_index, result_json in results:
+            journal.append(row_index, result_json)
+        _wait_for_journal(journal)
+        
+        skipped = len(texts) - len(results)
+        if skipped:
+            st.warning(f"{skipped}件は置換または話者分離に失敗したため、結果を書き込みませんでした")
+        progress_bar.progress(1.0)
         
     except Exception as e:
+        invalidate_worksheet()
         st.error(f"バッチ処理エラー: {str(e)}")
 
 
-def _create_header_map(header_row):
-    """ヘッダー行からカラムマップを作成"""
-    header_map = {}
-    for i, header in enumerate(header_row):
-        if header.strip():
-            header_map[header.strip()] = i + 1  # gspreadは1ベース
-    return header_map
+def _run_offline_stage(backend, stage_number, label, requests, progress_bar, status_text, poll_interval, total_stages=4):
+    """1段階分のリクエストをバッチ送信し、{(行番号, ノード名): 応答} を返す
+
+    Batch APIは1つの入力ファイルに1つのモデルしか指定できないため、ノードごとのモデル
+    （NODE_MODEL_<ノード名>）でリクエストを分け、モデルごとのバッチを並行して待つ。
+    """
+    if not requests:
+        return {}
+    
+    lines_by_model = {}
+    for (row_index, node_name), (system_prompt, user_prompt, expect_json) in requests.items():
+        model = get_node_model(node_name)
+        lines_by_model.setdefault(model, []).append(build_batch_line(
+            f"{row_index}:{node_name}", system_prompt, user_prompt, model,
+            response_format={"type": "json_object"} if expect_json else None
+        ))
+    
+    batch_statuses = {}
+    status_lock = threading.Lock()
+    
+    def _on_status(model, batch):
+        with status_lock:
+            batch_statuses[model] = batch
+            states = "、".join(sorted({str(b.get("status")) for b in batch_statuses.values()}))
+            completed = sum((b.get("request_counts") or {}).get("completed", 0) for b in batch_statuses.values())
+        status_text.markdown(
+            f"<p style='text-align: center; font-weight: 500;'>"
+            f"ステージ {stage_number}/{total_stages}: {label}（状態: {states}、"
+            f"{completed}/{len(requests)}件完了）</p>",
+            unsafe_allow_html=True
+        )
+    
+    tasks = {
+        model: (lambda model=model, lines=lines: run_batch(
+            backend, lines, poll_interval=poll_interval, on_status=lambda batch: _on_status(model, batch)
+        ))
+        for model, lines in lines_by_model.items()
+    }
+    outputs = {}
+    for model_outputs in run_parallel(tasks).values():
+        outputs.update(model_outputs)
+    progress_bar.progress(stage_number / (total_stages + 1))
+    
+    results = {}
+    for custom_id, content in outputs.items():
+        row_index, node_name = custom_id.split(":", 1)
+        results[(int(row_index), node_name)] = content
+    return results
+
+
+@traced()
+def list_target_rows(gc, max_rows=50):
+    """保存先から品質チェック対象の行を取得"""
+    try:
+        status_msg = st.empty()
+        status_msg.markdown("""
+        <div class="info-box">
+          🔍 品質チェック対象データを取得中...
+        </div>
+        """, unsafe_allow_html=True)
+        
+        header_row, target_rows = get_result_store(gc).list_pending(max_rows)
+        
+        # 完了後は表示をクリア
+        status_msg.empty()
+        
+        return header_row, target_rows
+    except Exception as e:
+        invalidate_worksheet()
+        st.markdown(f"""
+        <div class="error-box">
+          ❌ 品質チェック対象データの取得に失敗しました: {str(e)}
+        </div>
+        """, unsafe_allow_html=True)
+        return [], []
+
+
+def start_result_journal(gc, batch_size=10):
+    """結果の書き込み先を保存先（RESULT_STORE）に設定し、ジャーナルの書き込みを開始
+
+    前回の実行で書き込めなかった結果があれば、この時点からバックグラウンドで書き込まれる。
+    """
+    store = get_result_store(gc)
+    
+    def _write_results(results):
+        # 結果の書き込みはバックグラウンドで行うため、文字起こしの保存など画面操作のリクエストを優先させる
+        with sheets_priority(PRIORITY_BATCH):
+            store.write_results(results)
+    
+    journal = get_result_journal()
+    # 行IDの体系は保存先ごとに異なるため、結果には保存先の名前を記録する
+    journal.configure(_write_results, flush_threshold=batch_size, store=store.name)
+    return journal
+
+
+def _wait_for_journal(journal, timeout=120):
+    """ジャーナルの書き込み待ちがなくなるまで待ち、結果を表示"""
+    batch_status = st.empty()
+    batch_status.markdown(f"""
+    <div class="info-box">
+      ⏳ Googleスプレッドシートを更新中...（残り{journal.pending_count()}件）
+    </div>
+    """, unsafe_allow_html=True)
+    
+    if journal.drain(timeout):
+        batch_status.empty()
+        st.success("✅ 品質チェック結果をスプレッドシートに更新しました")
+    else:
+        batch_status.markdown(f"""
+        <div class="warning-box">
+          ⚠️ スプレッドシートへの書き込みが完了していません（残り{journal.pending_count()}件）。
+          結果はローカルに保存済みのため、バックグラウンドで再試行されます。{journal.last_error or ""}
+        </div>
+        """, unsafe_allow_html=True)
+    
+    render_failed_results(journal)
+
+
+def render_failed_results(journal, key="requeue_failed_results"):
+    """書き込めなかった結果の件数と、書き込み待ちに戻すボタンを表示"""
+    other_pending = journal.other_store_pending_count()
+    if other_pending:
+        st.markdown(f"""
+        <div class="info-box">
+          ℹ️ 別の保存先（RESULT_STORE）向けの書き込み待ちの結果が{other_pending}件あります。
+          その保存先に戻すと書き込まれます。
+        </div>
+        """, unsafe_allow_html=True)
+    
+    failed = journal.failed_count()
+    if not failed:
+        return
+    st.markdown(f"""
+    <div class="warning-box">
+      ⚠️ {failed}件の結果は書き込み先がエラーを返したため書き込めませんでした。{journal.last_error or ""}
+    </div>
+    """, unsafe_allow_html=True)
+    st.button("書き込めなかった結果を再送", key=key, on_click=journal.requeue_failed)
+
+
+def render_mirror_status(gc):
+    """保存先からスプレッドシートへ複製できていない件数を表示（複製はバックグラウンドで再送される）"""
+    store = get_result_store(gc)
+    unmirrored = store.unmirrored_count()
+    if not unmirrored or not store.last_mirror_error:
+        return
+    st.markdown(f"""
+    <div class="warning-box">
+      ⚠️ {unmirrored}件をスプレッドシートに複製できていません。
+      ローカルには保存済みのため、バックグラウンドで再送されます。{store.last_mirror_error}
+    </div>
+    """, unsafe_allow_html=True)
 
 
 def _initialize_progress_display(progress_bar, status_text, total_rows):
@@ -77,63 +315,117 @@ def _setup_metrics_display(total_rows):
         </div>
         """, unsafe_allow_html=True)
     
+    col4, col5, col6 = st.columns(3)
+    with col4:
+        tokens_container = st.empty()
+    with col5:
+        cost_container = st.empty()
+    with col6:
+        latency_container = st.empty()
+    
     return {
         'processed': processed_container,
         'success': success_container,
-        'total': total_container
+        'total': total_container,
+        'tokens': tokens_container,
+        'cost': cost_container,
+        'latency': latency_container
     }
 
 
-def _process_batch(target_rows, checker_str, client, worksheet, header_map,
-                  batch_size, progress_bar, status_text, metrics_containers):
-    """実際のバッチ処理を実行"""
-    results_batch = []
-    total_processed = 0
-    total_success = 0
-    
-    for i, (row_index, row) in enumerate(target_rows):
-        try:
-            # テキストとファイル名を取得
-            raw_transcript = row[0] if row else ""
-            if not raw_transcript:
-                continue
-                
-            filename = row[1] if len(row) > 1 else f"行 {row_index}"
-            
-            # 現在処理中のファイル表示
-            current_file = _show_current_processing(filename)
-            
-            # 品質チェックワークフロー実行
-            result_json = run_workflow(raw_transcript, checker_str, client)
-            
+def _process_batch(target_rows, checker_str, client, journal,
+                  progress_bar, status_text, metrics_containers, max_workers=1,
+                  pipeline=PIPELINE_STANDARD):
+    """実際のバッチ処理を実行（max_workers件の会話記録を同時に処理）
+
+    完了した結果はジャーナルに追記するだけで、スプレッドシートへの書き込みはバックグラウンドで行う。
+    """
+    # A列が空の行は処理対象外
+    rows = {row_index: row for row_index, row in target_rows if row and row[0]}
+    state = {'completed': 0, 'processed': 0, 'success': 0}
+    
+    def _on_row_complete(row_index, result_json, error):
+        # 完了順に呼ばれるが、結果は行番号と組にして保持するため書き込み先はずれない
+        state['completed'] += 1
+        if error is not None:
+            st.error(f"行 {row_index} の処理エラー: {str(error)}")
+        else:
             if result_json:
-                results_batch.append((row_index, result_json))
-                total_success += 1
-            
-            # 現在処理中の表示をクリア
-            current_file.empty()
-            total_processed += 1
+                # ローカルに永続化してから書き込みを待たずに次へ進む
+                journal.append(row_index, result_json)
+                state['success'] += 1
+            state['processed'] += 1
             
             # メトリクス更新
-            _update_metrics(metrics_containers, total_processed, total_success, len(target_rows))
-            
-            # バッチサイズに達した場合、または最後の処理の場合にスプレッドシート更新
-            if len(results_batch) >= batch_size or i == len(target_rows) - 1:
-                if results_batch:
-                    _update_spreadsheet_batch(worksheet, header_map, results_batch)
-                    results_batch = []
-            
-            # 進捗更新
-            progress = (i + 1) / len(target_rows)
-            progress_bar.progress(progress)
-            status_text.markdown(
-                f"<p style='text-align: center; font-weight: 500;'>{i + 1}/{len(target_rows)} 処理完了</p>", 
-                unsafe_allow_html=True
-            )
-            
-        except Exception as e:
-            st.error(f"行 {row_index} の処理エラー: {str(e)}")
-            continue
+            _update_metrics(metrics_containers, state['processed'], state['success'], len(target_rows))
+        
+        # 進捗更新
+        progress_bar.progress(state['completed'] / len(rows))
+        status_text.markdown(
+            f"<p style='text-align: center; font-weight: 500;'>{state['completed']}/{len(rows)} 処理完了</p>", 
+            unsafe_allow_html=True
+        )
+    
+    tasks = {
+        row_index: (lambda row_index=row_index, row=row: _run_row(row_index, row, checker_str, client, pipeline))
+        for row_index, row in rows.items()
+    }
+    run_parallel(tasks, max_workers=max_workers, on_complete=_on_row_complete, return_exceptions=True)
+    
+    # 残りの結果がスプレッドシートに反映されるのを待つ
+    _wait_for_journal(journal)
+    
+    _show_prompt_cache_stats()
+    _show_usage_by_node()
+
+
+def _show_usage_by_node():
+    """ノード別のトークン数・コスト・所要時間を表示（どのノードが時間とコストを占めているかの確認用）"""
+    nodes = get_usage_summary()['nodes']
+    if not nodes:
+        return
+    st.markdown("#### ノード別の使用量")
+    st.table([
+        {
+            "ノード": name,
+            "呼び出し": stats['calls'],
+            "キャッシュ": stats['cache_hits'],
+            "リトライ": stats['retries'],
+            "入力トークン": stats['prompt_tokens'],
+            "出力トークン": stats['completion_tokens'],
+            "キャッシュ適用トークン": stats['cached_tokens'],
+            "概算コスト(USD)": f"{stats['cost_usd']:.4f}",
+            "API時間(秒)": f"{stats['latency_seconds']:.1f}"
+        }
+        for name, stats in sorted(nodes.items(), key=lambda item: item[1]['latency_seconds'], reverse=True)
+    ])
+
+
+def _show_prompt_cache_stats():
+    """この実行でのプロンプトキャッシュの適用状況（入力トークンのうちキャッシュが効いた割合）を表示"""
+    total = get_usage_summary()['total']
+    prompt_tokens = total['prompt_tokens']
+    cached_tokens = total['cached_tokens']
+    if prompt_tokens:
+        st.caption(
+            f"プロンプトキャッシュ適用率: {cached_tokens / prompt_tokens * 100:.1f}%"
+            f"（{cached_tokens:,} / {prompt_tokens:,} トークン）"
+        )
+
+
+def _run_row(row_index, row, checker_str, client, pipeline=PIPELINE_STANDARD):
+    """1行分の品質チェックワークフローを実行（ワーカースレッドで実行される）"""
+    filename = row[1] if len(row) > 1 else f"行 {row_index}"
+    
+    # 現在処理中のファイル表示
+    current_file = _show_current_processing(filename)
+    try:
+        # この行で行われたAPI呼び出しを行別に集計し、行ごとのスパンの下に記録する
+        with usage_row(row_index), span("row", row_index=row_index, filename=filename):
+            return run_workflow(row[0], checker_str, client, pipeline=pipeline)
+    finally:
+        # 現在処理中の表示をクリア
+        current_file.empty()
 
 
 def _show_current_processing(filename):
@@ -164,27 +456,30 @@ def _update_metrics(metrics_containers, processed, success, total):
       <p>{success_rate:.1f}%</p>
     </div>
     """, unsafe_allow_html=True)
-
-
-def _update_spreadsheet_batch(worksheet, header_map, results_batch):
-    """バッチ単位でスプレッドシートを更新"""
-    batch_status = st.empty()
-    batch_status.markdown("""
-    <div class="info-box">
-      ⏳ Googleスプレッドシートを更新中...
+    
+    usage = get_usage_summary()
+    total_usage = usage['total']
+    rows = usage['rows']
+    average_latency = sum(stats['latency_seconds'] for stats in rows.values()) / len(rows) if rows else 0
+    
+    metrics_containers['tokens'].markdown(f"""
+    <div class="metric-card">
+      <h3>🔢 トークン数</h3>
+      <p>{total_usage['prompt_tokens'] + total_usage['completion_tokens']:,}</p>
     </div>
     """, unsafe_allow_html=True)
     
-    try:
-        # 正しいパラメータでupdate_quality_check_results関数を呼び出し
-        update_quality_check_results(worksheet, header_map, results_batch)
-        time.sleep(1)  # API制限を避けるための待機
-        batch_status.empty()
-    except Exception as e:
-        batch_status.markdown(f"""
-        <div class="error-box">
-          ❌ スプレッドシート更新エラー: {str(e)}
-        </div>
-        """, unsafe_allow_html=True)
-        time.sleep(2)
-        batch_status.empty() 
\ No newline at end of file
+    metrics_containers['cost'].markdown(f"""
+    <div class="metric-card">
+      <h3>💰 概算コスト</h3>
+      <p>${total_usage['cost_usd']:.4f}</p>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    metrics_containers['latency'].markdown(f"""
+    <div class="metric-card">
+      <h3>⏱️ API時間/件</h3>
+      <p>{average_latency:.1f}秒</p>
+    </div>
+    """, unsafe_allow_html=True)
+
@@ -0,0 +1,60 @@
+"""
+スレッドプールによる並列実行ユーティリティ
+"""
+
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+try:
+    from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+except ImportError:  # Streamlit外（バッチ実行など）から呼ばれた場合
+    add_script_run_ctx = None
+    get_script_run_ctx = None
+
+
+def _bind_script_context(fn, script_ctx):
+    """ワーカースレッドからもst.*の表示が行えるようにStreamlitのコンテキストを引き継ぐ"""
+    def wrapper():
+        if script_ctx is not None and add_script_run_ctx is not None:
+            add_script_run_ctx(threading.current_thread(), script_ctx)
+        return fn()
+    return wrapper
+
+
+def run_parallel(tasks, max_workers=None, on_complete=None, return_exceptions=False):
+    """名前付きタスクを並列実行し、{名前: 結果} を返す
+
+    tasks は {名前: 引数なしの呼び出し可能オブジェクト} の辞書。
+    on_complete(name, result, error) は完了した順に呼び出し元スレッドで呼ばれる。
+    各タスクは呼び出し元のコンテキスト変数（集計対象の行など）のコピー上で実行される。
+    return_exceptions が False の場合、全タスクの完了を待ってから最初の例外を再送出する。
+    """
+    if not tasks:
+        return {}
+
+    script_ctx = get_script_run_ctx() if get_script_run_ctx is not None else None
+    results = {}
+    first_error = None
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(tasks)) as executor:
+        futures = {
+            executor.submit(contextvars.copy_context().run, _bind_script_context(fn, script_ctx)): name
+            for name, fn in tasks.items()
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                result, error = future.result(), None
+            except Exception as e:
+                result, error = None, e
+                if first_error is None:
+                    first_error = e
+
+            results[name] = error if (error is not None and return_exceptions) else result
+            if on_complete:
+                on_complete(name, result, error)
+
+    if first_error is not None and not return_exceptions:
+        raise first_error
+    return results
@@ -4,44 +4,291 @@
 
 import streamlit as st
 import json
-from src.prompts.system_prompts import SYSTEM_PROMPTS
+from src.prompts.prompt_builder import build_system_prompt
 from src.api.openai_client import chat_with_retry
+from src.api.model_routing import get_node_model, get_escalation_model
+from src.api.sheets_client import RESULT_HEADER_MAP
+from src.utils.parallel import run_parallel
+from src.utils.text_chunker import chunk_text, MAX_CHUNK_WORKERS
+from src.utils.tracing import traced
+from src.utils.rule_engine import LOCAL_CHECK_NODES, evaluate_rules, format_rule_report, apply_rule_results
 
+# 話者分離済みテキストを入力とする5つのチェックノード（連結順）
+CHECK_NODES = (
+    'company_name_check',
+    'teleapo_response_check',
+    'longcall_check',
+    'customer_reaction_check',
+    'manner_check',
+)
+
+# ワークフローの方式
+PIPELINE_STANDARD = "standard"      # 5項目のチェック→連結→JSON変換（Dify互換）
+PIPELINE_STRUCTURED = "structured"  # 全ルールを1回の構造化出力で判定
+# 方式ごとのステップ数（進捗表示用）
+PIPELINE_STEPS = {PIPELINE_STANDARD: 9, PIPELINE_STRUCTURED: 3}
+
+# 構造化出力で判定する列（「ガチャ切りされた△」は判定ルールがないため対象外）
+_UNJUDGED_COLUMNS = ("テレアポ担当者名", "報告まとめ", "ガチャ切りされた△")
+RULE_COLUMNS = [column for column in RESULT_HEADER_MAP if column not in _UNJUDGED_COLUMNS]
+
+def _build_result_response_format():
+    """スプレッドシートの列名をキーとするJSONスキーマ（構造化出力用）"""
+    properties = {
+        "テレアポ担当者名": {"type": "string"},
+        "報告まとめ": {"type": "array", "items": {"type": "string"}},
+    }
+    for column in RULE_COLUMNS:
+        properties[column] = {"type": "string", "enum": ["問題あり", "問題なし", "処理失敗"]}
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "teleapo_check_result",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": properties,
+                "required": list(properties),
+                "additionalProperties": False
+            }
+        }
+    }
+
+RESULT_RESPONSE_FORMAT = _build_result_response_format()
+
+def build_node_request(node_name, input_text, checker_str=""):
+    """ノードのリクエスト内容 (システムプロンプト, ユーザープロンプト, expect_json) を作成
+
+    システムプロンプトは静的なルール本文→担当者名一覧の順とし、会話記録などの入力は
+    常にユーザープロンプトに入れる（先頭が一致するためプロンプトキャッシュが効く）。
+    """
+    if node_name in ('replace', 'company_name_check', 'combined_check'):
+        system_prompt = build_system_prompt(node_name, checker=checker_str)
+    else:
+        system_prompt = build_system_prompt(node_name)
+    if node_name == 'to_json':
+        return system_prompt, f"#インプット内容\n{input_text}", True
+    return system_prompt, input_text, node_name == 'speaker'
+
+# 出力にこれらの語が含まれる場合は判定に失敗したとみなす
+_UNCERTAIN_MARKERS = ("判定不明", "処理失敗")
+
+def is_valid_node_output(node_name, output):
+    """ノードの出力が後続の処理に使えるかを検証"""
+    if output is None:
+        return False
+    if node_name == 'speaker':
+        return parse_speaker_segments(output) is not None
+    if node_name == 'to_json':
+        return isinstance(output, dict)
+    if node_name == 'combined_check':
+        result = parse_structured_result(output)
+        return result is not None and all(result[column] not in _UNCERTAIN_MARKERS for column in RULE_COLUMNS)
+    if not isinstance(output, str) or not output.strip():
+        return False
+    if node_name in CHECK_NODES:
+        return "判定" in output and not any(marker in output for marker in _UNCERTAIN_MARKERS)
+    return True
+
+def call_node_model(node_name, system_prompt, user_prompt, client, expect_json=False, response_format=None):
+    """ノードの通常モデルで実行し、出力が検証に通らない場合のみ上位モデルで再実行する"""
+    output = chat_with_retry(
+        client, system_prompt, user_prompt, expect_json=expect_json, model=get_node_model(node_name),
+        response_format=response_format, node=node_name
+    )
+    if is_valid_node_output(node_name, output):
+        return output
+    escalation_model = get_escalation_model(node_name)
+    if escalation_model is None:
+        return output
+    escalated = chat_with_retry(
+        client, system_prompt, user_prompt, expect_json=expect_json, model=escalation_model,
+        response_format=response_format, node=node_name
+    )
+    return escalated if escalated is not None else output
+
+def _run_node(node_name, input_text, client, checker_str=""):
+    """ノードのリクエストを作成してLLMを呼び出す"""
+    system_prompt, user_prompt, expect_json = build_node_request(node_name, input_text, checker_str)
+    return call_node_model(node_name, system_prompt, user_prompt, client, expect_json=expect_json)
+
+def _run_node_chunked(node_name, input_text, client, checker_str=""):
+    """入力を文の境界でチャンクに分割し、同じノードを並列に実行して結果を入力順に返す
+
+    置換・話者分離は入力全体を出力し直すため、長い会話記録では出力トークン上限に達し、
+    生成も直列になる。チャンクごとに並列実行することで切り詰めと待ち時間を防ぐ。
+    """
+    chunks = chunk_text(input_text)
+    if len(chunks) <= 1:
+        return [_run_node(node_name, input_text, client, checker_str)]
+    tasks = {
+        index: (lambda chunk=chunk: _run_node(node_name, chunk, client, checker_str))
+        for index, chunk in enumerate(chunks)
+    }
+    results = run_parallel(tasks, max_workers=MAX_CHUNK_WORKERS)
+    return [results[index] for index in range(len(chunks))]
+
+@traced(node='replace')
 def node_replace(input_text, checker_str, client):
-    """固有名詞を置換するノード（Dify互換）"""
-    prompt = SYSTEM_PROMPTS['replace'].format(checker=checker_str)
-    return chat_with_retry(client, prompt, input_text)
+    """固有名詞を置換するノード（Dify互換・長文はチャンク分割して並列実行）"""
+    outputs = _run_node_chunked('replace', input_text, client, checker_str)
+    # 1つでも失敗したチャンクがあれば会話の一部が欠けるため、全体を失敗とする
+    if any(not output or not output.strip() for output in outputs):
+        return None
+    return "\n".join(output.strip() for output in outputs)
+
+# 話者分離で次のチャンクに文脈として渡す直前の発話数
+SPEAKER_CONTEXT_SEGMENTS = 4
 
+@traced(node='speaker')
 def node_speaker_separation(text_fixed, client):
-    """話者分離を行うノード（Dify互換）"""
-    prompt = SYSTEM_PROMPTS['speaker']
-    return chat_with_retry(client, prompt, text_fixed, expect_json=True)
+    """話者分離を行うノード（Dify互換・長文はチャンク分割して順に実行）
+
+    JSONモードで取得した結果を検証し、segments のリストを返す（不正な場合はNone）。
+    チャンクごとに独立して分離すると境界で agent/customer が入れ替わることがあるため、
+    直前のチャンクの末尾の発話を文脈として渡し、チャンクは順に処理する。
+    """
+    chunk_segments = []
+    context = []
+    for chunk in chunk_text(text_fixed):
+        segments = parse_speaker_segments(_run_node('speaker', build_speaker_input(chunk, context), client))
+        if segments is None:
+            return None
+        chunk_segments.append(segments)
+        context = segments[-SPEAKER_CONTEXT_SEGMENTS:]
+    return merge_segments(chunk_segments)
+
+def build_speaker_input(chunk, context_segments=None):
+    """話者分離の入力を作成（直前の発話がある場合は参考として先頭に付ける）"""
+    if not context_segments:
+        return chunk
+    return (
+        "#直前までの会話（話者分離済み。話者の対応をそろえるための参考で、出力には含めない）\n"
+        f"{format_segments(context_segments)}\n\n"
+        f"#話者分離する会話（この続き）\n{chunk}"
+    )
 
+def merge_segments(chunk_segments):
+    """チャンクごとの話者分離結果を順に結合（境界で同じ話者が続く場合は1つの発話にまとめる）"""
+    merged = []
+    for segments in chunk_segments:
+        for segment in segments:
+            if merged and merged[-1]["speaker"] == segment["speaker"]:
+                merged[-1] = {
+                    "speaker": segment["speaker"],
+                    "text": merged[-1]["text"] + segment["text"]
+                }
+            else:
+                merged.append(dict(segment))
+    return merged
+
+def parse_speaker_segments(result):
+    """話者分離の結果を {"segments": [{"speaker", "text"}, ...]} の形式として検証"""
+    if isinstance(result, str):
+        try:
+            result = json.loads(result)
+        except ValueError:
+            return None
+    if not isinstance(result, dict) or not isinstance(result.get("segments"), list):
+        return None
+    
+    segments = []
+    for segment in result["segments"]:
+        if (not isinstance(segment, dict)
+                or segment.get("speaker") not in ("agent", "customer")
+                or not isinstance(segment.get("text"), str)):
+            return None
+        segments.append({"speaker": segment["speaker"], "text": segment["text"].strip()})
+    return segments or None
+
+def format_segments(segments):
+    """話者分離結果を後続のチェックノードに渡すテキストに変換"""
+    return json.dumps({"segments": segments}, ensure_ascii=False, indent=2)
+
+@traced(node='company_name_check')
 def node_company_name_check(text_separated, checker_str, client):
     """社名・担当者名の確認を行うノード（Dify互換）"""
-    prompt = SYSTEM_PROMPTS['company_name_check'].format(checker=checker_str)
-    return chat_with_retry(client, prompt, text_separated)
+    return _run_node('company_name_check', text_separated, client, checker_str)
 
+@traced(node='teleapo_response_check')
 def node_teleapo_response_check(text_separated, client):
     """テレアポ担当者の対応チェックを行うノード（Dify互換）"""
-    prompt = SYSTEM_PROMPTS['teleapo_response_check']
-    return chat_with_retry(client, prompt, text_separated)
+    return _run_node('teleapo_response_check', text_separated, client)
 
+@traced(node='longcall_check')
 def node_longcall_check(text_separated, client):
     """ロングコールチェックを行うノード（Dify互換）"""
-    prompt = SYSTEM_PROMPTS['longcall_check']
-    return chat_with_retry(client, prompt, text_separated)
+    return _run_node('longcall_check', text_separated, client)
 
+@traced(node='customer_reaction_check')
 def node_customer_reaction_check(text_separated, client):
     """お客様の反応チェックを行うノード（Dify互換）"""
-    prompt = SYSTEM_PROMPTS['customer_reaction_check']
-    return chat_with_retry(client, prompt, text_separated)
+    return _run_node('customer_reaction_check', text_separated, client)
 
+@traced(node='manner_check')
 def node_manner_check(text_separated, client):
     """心構え・マナーチェックを行うノード（Dify互換）"""
-    prompt = SYSTEM_PROMPTS['manner_check']
-    return chat_with_retry(client, prompt, text_separated)
+    return _run_node('manner_check', text_separated, client)
+
+@traced(node='combined_check')
+def node_structured_check(text_separated, checker_str, client):
+    """全ルールの判定を1回の構造化出力で行うノード（5項目のチェック・連結・JSON変換を置き換える）"""
+    system_prompt, user_prompt, _ = build_node_request('combined_check', text_separated, checker_str)
+    return call_node_model(
+        'combined_check', system_prompt, user_prompt, client, expect_json=True, response_format=RESULT_RESPONSE_FORMAT
+    )
+
+def parse_structured_result(result_text):
+    """構造化出力の結果を検証して辞書に変換（不正な場合はNone）"""
+    if isinstance(result_text, dict):
+        result = result_text
+    else:
+        try:
+            result = json.loads(result_text)
+        except (TypeError, ValueError):
+            return None
+    if not isinstance(result, dict):
+        return None
+    
+    result.setdefault("テレアポ担当者名", "不明")
+    result.setdefault("報告まとめ", [])
+    if not result["報告まとめ"]:
+        result["報告まとめ"] = ["特に問題は検出されませんでした"]
+    for column in RULE_COLUMNS:
+        result.setdefault(column, "処理失敗")
+    result.setdefault("ガチャ切りされた△", "処理失敗")  # この項目は現在のワークフローにないため
+    return result
+
+def run_check_nodes(text_separated, checker_str, client, on_complete=None, rule_results=None):
+    """話者分離済みテキストに対する5つのチェックノードを並列実行
+
+    rule_results（ローカル判定の結果）を渡すと、ローカル判定だけで完結するノードはLLMを呼ばずに
+    同じテンプレート形式の判定テキストで置き換える。
+    """
+    tasks = {
+        'company_name_check': lambda: node_company_name_check(text_separated, checker_str, client),
+        'teleapo_response_check': lambda: node_teleapo_response_check(text_separated, client),
+        'longcall_check': lambda: node_longcall_check(text_separated, client),
+        'customer_reaction_check': lambda: node_customer_reaction_check(text_separated, client),
+        'manner_check': lambda: node_manner_check(text_separated, client),
+    }
+    local_results = {}
+    if rule_results is not None:
+        for name, columns in LOCAL_CHECK_NODES.items():
+            del tasks[name]
+            local_results[name] = format_rule_report(rule_results, columns)
+    completed = list(local_results)
 
+    def _on_node_complete(name, result, error):
+        completed.append(name)
+        if on_complete:
+            on_complete(len(completed))
+
+    results = run_parallel(tasks, on_complete=_on_node_complete)
+    # 失敗したノードは従来どおり「チェック失敗」として後続に渡す
+    return {**local_results, **{name: (result or "チェック失敗") for name, result in results.items()}}
+
+@traced(node='concat')
 def node_concat(company_name_check, teleapo_response_check, longcall_check, customer_reaction_check, manner_check):
     """各チェック結果を連結するノード（Dify互換）"""
     return (
@@ -52,14 +299,44 @@ def node_concat(company_name_check, teleapo_response_check, longcall_check, cust
         f"{manner_check}"
     )
 
+@traced(node='to_json')
 def node_to_json(concatenated, client):
     """結果をJSONに変換するノード（Dify互換）"""
-    prompt = SYSTEM_PROMPTS['to_json']
-    full_prompt = f"{prompt}\n\n#インプット内容\n{concatenated}"
-    return chat_with_retry(client, full_prompt, "", expect_json=True)
+    return _run_node('to_json', concatenated, client)
+
+def finalize_result_json(result_json, check_results):
+    """JSON変換結果を検証し、失敗時はチェック結果からフォールバックJSONを作成"""
+    if isinstance(result_json, dict):
+        # JSONモードでパース済みの結果
+        return json.dumps(result_json, ensure_ascii=False, indent=2)
+    if result_json:
+        result_json = result_json.strip()
+        # JSON形式でない場合は、手動でJSONを作成
+        if result_json.startswith('{') and result_json.endswith('}'):
+            return result_json
+        st.warning("JSON変換に失敗したため、手動でJSONを作成します")
+    else:
+        # API呼び出し失敗時のフォールバック
+        st.warning("JSON変換APIが失敗したため、フォールバックJSONを使用します")
+    fallback_json = create_fallback_json(*(check_results[name] for name in CHECK_NODES))
+    return json.dumps(fallback_json, ensure_ascii=False, indent=2)
 
-def run_workflow(raw_transcript, checker_str, client):
-    """品質チェックのワークフローを実行（Dify互換版）"""
+def merge_rule_results(result_json, rule_results):
+    """JSON文字列の結果にローカル判定を反映（JSONとして読めない場合はそのまま返す）"""
+    try:
+        result = json.loads(result_json)
+    except (TypeError, ValueError):
+        return result_json
+    if not isinstance(result, dict):
+        return result_json
+    return json.dumps(apply_rule_results(result, rule_results), ensure_ascii=False, indent=2)
+
+@traced()
+def run_workflow(raw_transcript, checker_str, client, pipeline=PIPELINE_STANDARD):
+    """品質チェックのワークフローを実行（Dify互換版）
+
+    pipeline に PIPELINE_STRUCTURED を指定すると、話者分離後の判定を1回の構造化出力で行う。
+    """
     try:
         workflow_progress = st.progress(0)
         status_text = st.empty()
@@ -69,85 +346,55 @@ def run_workflow(raw_transcript, checker_str, client):
             st.warning("入力テキストが空です")
             return None
         
+        total = PIPELINE_STEPS.get(pipeline, PIPELINE_STEPS[PIPELINE_STANDARD])
+
         # 1. 固有名詞の置換
-        status_text.markdown("**ステップ 1/9**: 固有名詞の置換")
+        status_text.markdown(f"**ステップ 1/{total}**: 固有名詞の置換")
         text_fixed = node_replace(raw_transcript, checker_str, client)
         if not text_fixed or not text_fixed.strip():
             st.warning("ステップ1: 固有名詞の置換でエラーが発生しました")
             return None
-        workflow_progress.progress(1/9)
+        workflow_progress.progress(1/total)
 
         # 2. 話者分離
-        status_text.markdown("**ステップ 2/9**: 話者分離")
-        text_separated = node_speaker_separation(text_fixed, client)
-        if not text_separated or not text_separated.strip():
-            st.warning("ステップ2: 話者分離でエラーが発生しました")
+        status_text.markdown(f"**ステップ 2/{total}**: 話者分離")
+        segments = node_speaker_separation(text_fixed, client)
+        if not segments:
+            st.warning("ステップ2: 話者分離でエラーが発生しました（有効なsegmentsが得られませんでした）")
             return None
-        workflow_progress.progress(2/9)
-
-        # 3. 社名・担当者名チェック
-        status_text.markdown("**ステップ 3/9**: 社名・担当者名チェック")
-        company_name_check = node_company_name_check(text_separated, checker_str, client)
-        if not company_name_check:
-            company_name_check = "チェック失敗"
-        workflow_progress.progress(3/9)
-        
-        # 4. テレアポ担当者対応チェック
-        status_text.markdown("**ステップ 4/9**: テレアポ担当者対応チェック")
-        teleapo_response_check = node_teleapo_response_check(text_separated, client)
-        if not teleapo_response_check:
-            teleapo_response_check = "チェック失敗"
-        workflow_progress.progress(4/9)
-            
-        # 5. ロングコールチェック
-        status_text.markdown("**ステップ 5/9**: ロングコールチェック")
-        longcall_check = node_longcall_check(text_separated, client)
-        if not longcall_check:
-            longcall_check = "チェック失敗"
-        workflow_progress.progress(5/9)
-            
-        # 6. お客様反応チェック
-        status_text.markdown("**ステップ 6/9**: お客様反応チェック")
-        customer_reaction_check = node_customer_reaction_check(text_separated, client)
-        if not customer_reaction_check:
-            customer_reaction_check = "チェック失敗"
-        workflow_progress.progress(6/9)
-            
-        # 7. 心構え・マナーチェック
-        status_text.markdown("**ステップ 7/9**: 心構え・マナーチェック")
-        manner_check = node_manner_check(text_separated, client)
-        if not manner_check:
-            manner_check = "チェック失敗"
-        workflow_progress.progress(7/9)
+        text_separated = format_segments(segments)
+        # 語句の出現で判定できるルールはローカルで判定し、LLMの判定より優先する
+        rule_results = evaluate_rules(segments)
+        workflow_progress.progress(2/total)
+
+        if pipeline == PIPELINE_STRUCTURED:
+            # 3. 全ルールを1回の呼び出しで判定（列名をキーとするJSONで返るため連結・JSON変換は不要）
+            status_text.markdown(f"**ステップ 3/{total}**: 全項目を一括チェック")
+            result = parse_structured_result(node_structured_check(text_separated, checker_str, client))
+            if result is not None:
+                workflow_progress.progress(1.0)
+                status_text.empty()
+                workflow_progress.empty()
+                return json.dumps(apply_rule_results(result, rule_results), ensure_ascii=False, indent=2)
+            st.warning("一括チェックの結果が不正なため、項目別のチェックで再実行します")
+            total = PIPELINE_STEPS[PIPELINE_STANDARD]
+
+        # 3〜7. 5つのチェックは互いに依存しないため並列に実行し、連結前に合流する
+        status_text.markdown(f"**ステップ 3-7/{total}**: 5項目のチェックを並列実行中")
+        check_results = run_check_nodes(
+            text_separated, checker_str, client,
+            on_complete=lambda done: workflow_progress.progress((2 + done) / total),
+            rule_results=rule_results
+        )
 
         # 8. 結果の連結
-        status_text.markdown("**ステップ 8/9**: 結果の連結")
-        concatenated = node_concat(company_name_check, teleapo_response_check, longcall_check, customer_reaction_check, manner_check)
-        workflow_progress.progress(8/9)
+        status_text.markdown(f"**ステップ 8/{total}**: 結果の連結")
+        concatenated = node_concat(*(check_results[name] for name in CHECK_NODES))
+        workflow_progress.progress(8/total)
 
         # 9. JSONに変換
-        status_text.markdown("**ステップ 9/9**: JSON形式に変換")
-        result_json = node_to_json(concatenated, client)
-        
-        # JSON変換結果の検証
-        if result_json:
-            result_json = result_json.strip()
-            # JSON形式でない場合は、手動でJSONを作成
-            if not (result_json.startswith('{') and result_json.endswith('}')):
-                st.warning("JSON変換に失敗したため、手動でJSONを作成します")
-                fallback_json = create_fallback_json(
-                    company_name_check, teleapo_response_check, longcall_check, 
-                    customer_reaction_check, manner_check
-                )
-                result_json = json.dumps(fallback_json, ensure_ascii=False, indent=2)
-        else:
-            # API呼び出し失敗時のフォールバック
-            st.warning("JSON変換APIが失敗したため、フォールバックJSONを使用します")
-            fallback_json = create_fallback_json(
-                company_name_check, teleapo_response_check, longcall_check, 
-                customer_reaction_check, manner_check
-            )
-            result_json = json.dumps(fallback_json, ensure_ascii=False, indent=2)
+        status_text.markdown(f"**ステップ 9/{total}**: JSON形式に変換")
+        result_json = merge_rule_results(finalize_result_json(node_to_json(concatenated, client), check_results), rule_results)
         
         workflow_progress.progress(1.0)
         
@@ -0,0 +1,281 @@
+"""
+品質チェック結果の書き込み待ちジャーナル（SQLite）
+
+ワークフローの結果はまずローカルのジャーナルに追記し、バックグラウンドのスレッドが
+まとめてスプレッドシートに書き込む。書き込みに失敗した結果はジャーナルに残ってリトライされ、
+アプリが途中で終了しても次回の起動時に書き込まれる（LLMの処理結果を失わない）。
+
+利用枠超過や通信障害などの一時的なエラーでは、結果は何回失敗しても書き込み待ちのまま残る。
+書き込み先が恒久的なエラー（不正な範囲など）を返した場合のみ、まとめた結果を分割して原因の行を
+特定し、その行だけを失敗として退避する（requeue_failed で書き込み待ちに戻せる）。
+
+行番号は保存先ごとの体系（スプレッドシートの行番号・SQLiteの連番）のため、各結果には保存先の名前を
+記録し、書き込み・検索は設定中の保存先の結果だけを対象とする。
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+import requests
+from src.api.cache import CACHE_DIR
+from src.api.rate_limiter import backoff_delay
+
+JOURNAL_PATH = os.getenv("RESULT_JOURNAL_PATH", os.path.join(CACHE_DIR, "result_journal.sqlite3"))
+# 書き込み待ちの結果がなくても確認する間隔（秒）
+FLUSH_INTERVAL_SECONDS = float(os.getenv("RESULT_JOURNAL_FLUSH_INTERVAL", "5"))
+# 1回の書き込みでまとめる最大件数
+MAX_FLUSH_ENTRIES = 200
+# 書き込みに失敗し続けた場合の再試行間隔の上限（秒）
+MAX_RETRY_INTERVAL_SECONDS = 60
+# 書き込み済みの記録を残す期間（秒）
+ACKED_RETENTION_SECONDS = 7 * 24 * 3600
+# 保存先の名前を記録する前のジャーナルの結果の保存先
+DEFAULT_STORE = "sheets"
+
+logger = logging.getLogger(__name__)
+
+
+def is_transient_error(error):
+    """時間を置けば成功する見込みのあるエラーか（429・5xx・通信エラー）
+
+    それ以外（4xx や TypeError などの不具合）は同じ内容を再送しても成功しないため、
+    原因の行を特定して失敗として退避する。
+    """
+    status_code = getattr(getattr(error, "response", None), "status_code", None)
+    if status_code is not None:
+        return status_code == 429 or status_code >= 500
+    return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout, OSError))
+
+
+class ResultJournal:
+    """結果を永続化し、writer でまとめて書き込むジャーナル（スレッドセーフ）
+
+    writer は [(行番号, 結果), ...] を受け取って書き込む関数。失敗時は例外を送出する。
+    store は writer の書き込み先の名前で、追記した結果に記録される。
+    """
+
+    def __init__(self, path, writer=None, flush_threshold=10, flush_interval=FLUSH_INTERVAL_SECONDS,
+                 store=DEFAULT_STORE):
+        self.path = path
+        self.writer = writer
+        self.store = store
+        self.flush_threshold = flush_threshold
+        self.flush_interval = flush_interval
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._idle = threading.Condition()
+        self._thread = None
+        self._failures = 0
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS result_journal ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, row_index INTEGER NOT NULL, payload TEXT NOT NULL, "
+            "status TEXT NOT NULL DEFAULT 'pending', attempts INTEGER NOT NULL DEFAULT 0, "
+            "last_error TEXT, created_at REAL NOT NULL, acked_at REAL, "
+            f"store TEXT NOT NULL DEFAULT '{DEFAULT_STORE}')"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(result_journal)")}
+        if "store" not in columns:
+            self._conn.execute(
+                f"ALTER TABLE result_journal ADD COLUMN store TEXT NOT NULL DEFAULT '{DEFAULT_STORE}'"
+            )
+        self._conn.execute("DROP INDEX IF EXISTS result_journal_status")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS result_journal_store_status ON result_journal (store, status, id)"
+        )
+        self._conn.commit()
+
+    def configure(self, writer, flush_threshold=None, store=None):
+        """書き込み先と、まとめて書き込む件数を設定（設定後に未書き込みの結果の書き込みを始める）
+
+        画面の再実行のたびに呼ばれるため、書き込み中（_flush_lock）を待たずに設定だけを差し替える。
+        書き込み中の分は開始時の書き込み先にそのまま書き込まれる。
+        """
+        with self._lock:
+            self.writer = writer
+            if store:
+                self.store = store
+        if flush_threshold:
+            self.flush_threshold = flush_threshold
+        self.start()
+        self._wakeup.set()
+
+    def append(self, row_index, payload):
+        """結果をジャーナルに追記（スプレッドシートへの書き込みは待たない）"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO result_journal (row_index, payload, created_at, store) VALUES (?, ?, ?, ?)",
+                (row_index, payload, time.time(), self.store)
+            )
+            self._conn.commit()
+        if self.pending_count() >= self.flush_threshold:
+            self._wakeup.set()
+
+    def pending_count(self):
+        """書き込み待ちの件数"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM result_journal WHERE status = 'pending' AND store = ?", (self.store,)
+            ).fetchone()[0]
+
+    def other_store_pending_count(self):
+        """設定中とは別の保存先に書き込み待ちの件数（その保存先に切り替えると書き込まれる）"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM result_journal WHERE status = 'pending' AND store != ?", (self.store,)
+            ).fetchone()[0]
+
+    def pending_rows(self):
+        """書き込み待ちの結果がある行番号"""
+        with self._lock:
+            return {row for (row,) in self._conn.execute(
+                "SELECT DISTINCT row_index FROM result_journal WHERE status = 'pending' AND store = ?", (self.store,)
+            )}
+
+    def failed_count(self):
+        """恒久的なエラーで書き込めなかった件数"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM result_journal WHERE status = 'failed' AND store = ?", (self.store,)
+            ).fetchone()[0]
+
+    def requeue_failed(self):
+        """書き込めなかった結果を書き込み待ちに戻し、戻した件数を返す"""
+        with self._lock:
+            count = self._conn.execute(
+                "UPDATE result_journal SET status = 'pending', attempts = 0 WHERE status = 'failed' AND store = ?",
+                (self.store,)
+            ).rowcount
+            self._conn.commit()
+        if count:
+            self._wakeup.set()
+        return count
+
+    def flush(self):
+        """書き込み待ちの結果をまとめて書き込み、処理した件数を返す（一時的なエラーは送出）"""
+        with self._flush_lock:
+            with self._lock:
+                # 書き込み先と保存先の名前は同時に読み、この書き込みの間は同じ組を使う
+                writer, store = self.writer, self.store
+                if writer is None:
+                    return 0
+                entries = self._conn.execute(
+                    "SELECT id, row_index, payload FROM result_journal WHERE status = 'pending' AND store = ? "
+                    "ORDER BY id LIMIT ?",
+                    (store, MAX_FLUSH_ENTRIES)
+                ).fetchall()
+            if not entries:
+                return 0
+
+            # 同じ行の結果が複数ある場合は最新のものだけを書き込む
+            latest = {}
+            for entry_id, row_index, payload in entries:
+                latest[row_index] = payload
+
+            try:
+                rejected = self._write_isolating(writer, sorted(latest.items()))
+            except Exception as e:
+                # 一時的なエラーは書き込み待ちのまま残し、間隔を空けて再試行する
+                with self._lock:
+                    self._conn.executemany(
+                        "UPDATE result_journal SET attempts = attempts + 1, last_error = ? WHERE id = ?",
+                        [(str(e), entry_id) for entry_id, _, _ in entries]
+                    )
+                    self._conn.commit()
+                raise
+
+            now = time.time()
+            with self._lock:
+                self._conn.executemany(
+                    "UPDATE result_journal SET status = 'failed', attempts = attempts + 1, last_error = ? WHERE id = ?",
+                    [(rejected[row_index], entry_id) for entry_id, row_index, _ in entries if row_index in rejected]
+                )
+                self._conn.executemany(
+                    "UPDATE result_journal SET status = 'acked', acked_at = ? WHERE id = ?",
+                    [(now, entry_id) for entry_id, row_index, _ in entries if row_index not in rejected]
+                )
+                self._conn.execute(
+                    "DELETE FROM result_journal WHERE status = 'acked' AND acked_at < ?",
+                    (now - ACKED_RETENTION_SECONDS,)
+                )
+                self._conn.commit()
+            if rejected:
+                self.last_error = next(iter(rejected.values()))
+                logger.warning("%d件の結果を書き込めませんでした: %s", len(rejected), self.last_error)
+            return len(latest)
+
+    def _write_isolating(self, writer, items):
+        """items を書き込み、恒久的なエラーで書き込めなかった行を {行番号: エラー} で返す
+
+        恒久的なエラーの場合は半分ずつに分けて書き込み直し、原因の行だけを返す。
+        一時的なエラーは送出する（結果の書き込みは上書きのため、分割中に書き込み済みの分が
+        書き込み待ちに残って再度書き込まれても問題ない）。
+        """
+        try:
+            writer(items)
+            return {}
+        except Exception as e:
+            if is_transient_error(e):
+                raise
+            if len(items) == 1:
+                return {items[0][0]: str(e)}
+        middle = len(items) // 2
+        return {**self._write_isolating(writer, items[:middle]), **self._write_isolating(writer, items[middle:])}
+
+    def start(self):
+        """バックグラウンドの書き込みスレッドを開始（開始済みなら何もしない）"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="result-journal-flusher", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                while self.flush():
+                    pass
+                self._failures = 0
+                self.last_error = None
+            except Exception as e:
+                # 失敗した結果はジャーナルに残し、間隔を空けて再試行する
+                self._failures += 1
+                self.last_error = str(e)
+                logger.warning("結果の書き込みに失敗しました（再試行します）: %s", e)
+                time.sleep(backoff_delay(self._failures, cap=MAX_RETRY_INTERVAL_SECONDS))
+            with self._idle:
+                self._idle.notify_all()
+
+    def drain(self, timeout=60):
+        """書き込み待ちがなくなるまで待つ（タイムアウト時はFalse。残りはバックグラウンドで書き込まれる）"""
+        deadline = time.monotonic() + timeout
+        while self.pending_count():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            self._wakeup.set()
+            with self._idle:
+                self._idle.wait(min(remaining, 1.0))
+        return True
+
+
+_journal = None
+_journal_lock = threading.Lock()
+
+
+def get_result_journal():
+    """プロセス全体で共有するジャーナルを取得"""
+    global _journal
+    with _journal_lock:
+        if _journal is None:
+            _journal = ResultJournal(JOURNAL_PATH)
+        return _journal
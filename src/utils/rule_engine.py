@@ -0,0 +1,93 @@
+"""
+話者分離済みの会話記録に対して、語句の出現で判定できるルールをローカルで判定するモジュール
+
+LLMを呼ばずに正規表現と語彙の照合だけで判定するため、即時に同じ結果が得られる。
+"""
+
+import re
+
+# ロングコール: 「電話が鳴る」がこの回数以上で問題あり
+LONGCALL_THRESHOLD = 7
+_RING_PATTERN = re.compile(r"電話が鳴る")
+
+# agent の発話から検出する語句 (列名, [(表示名, 正規表現), ...])
+AGENT_LEXICAL_RULES = (
+    ("一人称が「僕」「自分」「俺」", [
+        ("僕", re.compile(r"僕(?!ら)")),
+        ("自分", re.compile(r"(?<![ご御])自分")),  # 「ご自分」は相手を指すため除外
+        ("俺", re.compile(r"俺")),
+    ]),
+    ("「弊社」のことを「うち」「僕ら」と言う", [
+        # 「そのうち」「今のうちに」などの用法は除外し、自社を指す「うちの」「うちは」等のみ対象とする
+        ("うち", re.compile(r"(?<![ぁ-ん])うち(?=[のはでがもと、。])")),
+        ("僕ら", re.compile(r"僕ら")),
+    ]),
+    ("謝罪が「すみません」「ごめんなさい」", [
+        ("すみません", re.compile(r"すみません|すいません")),
+        ("ごめんなさい", re.compile(r"ごめんなさい")),
+    ]),
+)
+
+# LLMを呼ばずにローカル判定だけで完結するチェックノードと、その判定列
+LOCAL_CHECK_NODES = {
+    'longcall_check': ("ロングコール",),
+}
+
+
+def check_longcall(segments):
+    """「電話が鳴る」の回数からロングコールを判定し (判定, 報告) を返す"""
+    count = sum(len(_RING_PATTERN.findall(segment["text"])) for segment in segments)
+    if count >= LONGCALL_THRESHOLD:
+        return "問題あり", f"「電話が鳴る」が{count}回あり、ロングコールに該当します"
+    return "問題なし", ""
+
+
+def check_agent_lexicon(segments, patterns):
+    """agent の発話に含まれる語句を数えて (判定, 報告) を返す"""
+    counts = {}
+    for segment in segments:
+        if segment["speaker"] != "agent":
+            continue
+        for label, pattern in patterns:
+            found = len(pattern.findall(segment["text"]))
+            if found:
+                counts[label] = counts.get(label, 0) + found
+    if not counts:
+        return "問題なし", ""
+    return "問題あり", "、".join(f"「{label}」が{count}回" for label, count in counts.items())
+
+
+def evaluate_rules(segments):
+    """ローカルで判定できる全ルールを判定し {列名: (判定, 報告)} を返す"""
+    results = {"ロングコール": check_longcall(segments)}
+    for column, patterns in AGENT_LEXICAL_RULES:
+        results[column] = check_agent_lexicon(segments, patterns)
+    return results
+
+
+def format_rule_report(rule_results, columns):
+    """判定結果をチェックノードの出力と同じテンプレート形式のテキストにする"""
+    return "\n\n".join(
+        f"▪️{column}\n判定 : {rule_results[column][0]}\n報告 : {rule_results[column][1]}"
+        for column in columns
+    )
+
+
+def apply_rule_results(result, rule_results):
+    """結果の辞書にローカル判定を反映し、問題ありの報告を報告まとめに追加
+
+    ローカル判定だけで完結する列（LOCAL_CHECK_NODES）は上書きする。語彙の照合はルールの一部しか
+    カバーしないため（例: 「わたしたち」もプロンプト上は問題あり）、それ以外の列は問題ありへの
+    格上げのみ行い、LLMの問題ありを問題なしで打ち消さない。
+    """
+    authoritative = {column for columns in LOCAL_CHECK_NODES.values() for column in columns}
+    reports = [report for report in result.get("報告まとめ") or [] if report != "特に問題は検出されませんでした"]
+    for column, (judgment, report) in rule_results.items():
+        if column in authoritative or judgment == "問題あり":
+            result[column] = judgment
+        if judgment == "問題あり":
+            line = f"{column}: {report}"
+            if line not in reports:
+                reports.append(line)
+    result["報告まとめ"] = reports or ["特に問題は検出されませんでした"]
+    return result
@@ -0,0 +1,70 @@
+"""
+トークン数の計測と、会話記録を文単位で分割するモジュール
+"""
+
+import os
+import re
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken が未インストールの場合は文字種から概算する
+    tiktoken = None
+
+# 1チャンクあたりの最大トークン数（出力も同程度の長さになるノード向け）
+MAX_CHUNK_TOKENS = int(os.getenv("TRANSCRIPT_CHUNK_TOKENS", "2000"))
+# 1行あたりにチャンクを並列実行する最大数（行の並列数と掛け合わせた数の接続を使う）
+MAX_CHUNK_WORKERS = int(os.getenv("TRANSCRIPT_CHUNK_WORKERS", "4"))
+
+# 文末（句点・感嘆符・疑問符・改行）の直後で区切る
+_SENTENCE_END = re.compile(r"(?<=[。！？!?\n])")
+
+_encodings = {}
+
+
+def _get_encoding(model):
+    if model not in _encodings:
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except KeyError:
+            _encodings[model] = tiktoken.get_encoding("o200k_base")
+    return _encodings[model]
+
+
+def count_tokens(text, model="gpt-4o-mini"):
+    """テキストのトークン数を取得"""
+    if not text:
+        return 0
+    if tiktoken is not None:
+        return len(_get_encoding(model).encode(text))
+    # 概算: 日本語などの非ASCII文字は1文字1トークン、ASCIIは4文字1トークン
+    non_ascii = sum(1 for ch in text if ord(ch) > 0x7F)
+    return non_ascii + (len(text) - non_ascii + 3) // 4
+
+
+def split_sentences(text):
+    """テキストを文単位に分割（区切り文字は各文の末尾に残す）"""
+    return [sentence for sentence in _SENTENCE_END.split(text) if sentence]
+
+
+def chunk_text(text, max_tokens=MAX_CHUNK_TOKENS, model="gpt-4o-mini"):
+    """文の境界で max_tokens 以下のチャンクに分割（1文が長すぎる場合のみ文の途中で区切る）"""
+    chunks = []
+    current, current_tokens = [], 0
+    for sentence in split_sentences(text):
+        tokens = count_tokens(sentence, model)
+        if tokens > max_tokens:
+            # 1文だけで上限を超える場合は文字数で分割
+            if current:
+                chunks.append("".join(current))
+                current, current_tokens = [], 0
+            step = max(1, len(sentence) * max_tokens // tokens)
+            chunks.extend(sentence[i:i + step] for i in range(0, len(sentence), step))
+            continue
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append("".join(current))
+            current, current_tokens = [], 0
+        current.append(sentence)
+        current_tokens += tokens
+    if current:
+        chunks.append("".join(current))
+    return chunks
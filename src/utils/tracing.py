@@ -0,0 +1,142 @@
+"""
+品質チェックのワークフローをスパン単位で計測するトレーシングモジュール
+
+スパンは親子関係と属性（行番号・ノード名・トークン数など）を持ち、終了時にChromeの
+Trace Event形式（chrome://tracing や Perfetto で表示可能）でローカルファイルに書き出す。
+並列実行時もスレッドごとのレーンに分かれるため、律速となった処理や遅れた行を確認できる。
+"""
+
+import functools
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from src.api.cache import CACHE_DIR
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "1") != "0"
+TRACE_DIR = os.getenv("TRACE_DIR", os.path.join(CACHE_DIR, "traces"))
+
+_current_span = ContextVar("current_span", default=None)
+_span_ids = itertools.count(1)
+
+logger = logging.getLogger(__name__)
+
+
+class Span:
+    """1つの処理区間"""
+
+    def __init__(self, name, parent=None, attributes=None):
+        self.name = name
+        self.span_id = next(_span_ids)
+        self.parent_id = parent.span_id if parent else None
+        self.trace_id = parent.trace_id if parent else self.span_id
+        self.attributes = dict(attributes or {})
+        self.thread_id = threading.get_ident()
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+
+    def set_attributes(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_trace_event(self):
+        """Trace Event形式の完了イベント（ph=X）に変換"""
+        return {
+            "name": self.name,
+            "cat": "quality_check",
+            "ph": "X",
+            "ts": self.start_ns // 1000,
+            "dur": (self.end_ns - self.start_ns) // 1000,
+            "pid": os.getpid(),
+            "tid": self.thread_id,
+            "args": {
+                "span_id": self.span_id,
+                "parent_id": self.parent_id,
+                "trace_id": self.trace_id,
+                **self.attributes
+            }
+        }
+
+
+class ChromeTraceExporter:
+    """スパンをTrace Event形式のJSON配列としてファイルに追記する
+
+    Trace Event形式では閉じ括弧のない配列も有効なため、終了処理なしで途中の内容も読み込める。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._started = False
+
+    def export(self, span):
+        line = json.dumps(span.to_trace_event(), ensure_ascii=False, default=str)
+        try:
+            with self._lock:
+                if not self._started:
+                    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                    with open(self.path, "w", encoding="utf-8") as f:
+                        f.write("[\n")
+                    self._started = True
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line + ",\n")
+        except OSError as e:
+            # トレースの書き出し失敗で本処理を止めない
+            logger.warning("トレースの書き込みに失敗しました: %s", e)
+
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def get_exporter():
+    """プロセスごとのトレース出力先を取得（無効な場合はNone）"""
+    global _exporter
+    if not TRACING_ENABLED:
+        return None
+    with _exporter_lock:
+        if _exporter is None:
+            filename = f"trace_{time.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}.json"
+            _exporter = ChromeTraceExporter(os.path.join(TRACE_DIR, filename))
+        return _exporter
+
+
+@contextmanager
+def span(name, **attributes):
+    """スパンを開始し、ブロックを抜けたときに終了して書き出す（親は実行中のスパン）"""
+    exporter = get_exporter()
+    if exporter is None:
+        yield None
+        return
+    current = Span(name, parent=_current_span.get(), attributes=attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except Exception as e:
+        current.set_attributes(error=f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end_ns = time.time_ns()
+        exporter.export(current)
+
+
+def traced(name=None, **attributes):
+    """関数の実行をスパンとして記録するデコレーター"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name or fn.__name__, **attributes):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def set_span_attributes(**attributes):
+    """実行中のスパンに属性を追加（スパンがない場合は何もしない）"""
+    current = _current_span.get()
+    if current is not None:
+        current.set_attributes(**attributes)